@@ -0,0 +1,360 @@
+import os
+import json
+import threading
+from datetime import date, datetime, timezone
+
+import database
+import store
+from recurring import PERIODS
+
+# alert rules, evaluated during sync against each page of new / changed transactions
+# and the fresh balances, never against the full history
+#
+#   budget             spend of a category or merchant in a calendar month reaches threshold
+#   large_transaction  a new charge of at least threshold
+#   new_subscription   a merchant charging a stable amount at a regular period for the first time
+#   low_balance        total balance of an account subtype drops below threshold
+#   low_margin         checking minus credit card balance drops below threshold
+#
+# rules live in the alert_rules table (see schema.sql), the defaults below apply while
+# it's empty. amounts are in cents like the store.
+#
+# what a sync needs to carry on where the last one stopped is kept in the alert_state
+# table, per item and saved just before its sync cursor moves:
+#
+#   counted    transaction_id -> [month, cents, rule ids], so a modified or removed
+#              transaction takes its old amount out of the totals again
+#   merchants  merchant -> its last three charges (transaction_id -> [date, cents]) and
+#              whether it was flagged recurring
+#   charged    transaction_id -> merchant of the charges kept there, so a modified or
+#              removed transaction replaces / drops its charge instead of adding one
+#
+# and in one row shared by all items (BUDGETS_KEY), since budgets add up every item:
+#
+#   totals     "rule:YYYY-MM" -> spend counted towards a budget (current + previous month)
+#   fired      "rule:YYYY-MM" of budgets that already fired, so a replayed page or an
+#              amount going down and up again doesn't fire twice
+#
+# a sync only adds its net change to the shared totals when it saves, a sync that
+# fails before that (and is retried from the old cursor) leaves them untouched.
+#
+# the first sync of an item builds the state without firing anything. fired alerts go
+# to the alerts table and to a local copy the pages read without asking supabase.
+
+DEFAULT_RULES = [
+    {"id": "low_margin", "kind": "low_margin", "threshold_cents": 15_000},
+    {"id": "large_transaction", "kind": "large_transaction", "threshold_cents": 50_000},
+    {"id": "new_subscription", "kind": "new_subscription"},
+]
+
+ALERTS_PATH = os.path.join("data", "alerts.json")
+RULES_PATH = os.path.join("data", "alert_rules.json")
+BUDGETS_KEY = "budgets"
+RECENT_ALERTS = 50
+# same tolerances as recurring.detect_recurring, charges kept per merchant
+AMOUNT_TOLERANCE_CENTS = 200
+AMOUNT_TOLERANCE_PCT = 0.10
+SUBSCRIPTION_CHARGES = 3
+
+_cache_lock = threading.Lock()
+# items sync in parallel, their changes to the shared budget totals go in one at a time
+_budgets_lock = threading.Lock()
+
+
+def load_rules():
+    rules = database.fetch_alert_rules()
+    rules = [rule for rule in rules if rule.get("enabled", True)] if rules else [dict(r) for r in DEFAULT_RULES]
+    # local copy for the pages (thresholds next to the balances they show)
+    def write(tmp):
+        with open(tmp, "w") as f:
+            json.dump(rules, f)
+    store.write_atomic(RULES_PATH, write)
+    return rules
+
+def local_rules():
+    # rules as of the last sync, no network
+    try:
+        with open(RULES_PATH) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return [dict(rule) for rule in DEFAULT_RULES]
+
+def rule(kind: str, rules: list = None):
+    # first rule of a kind, None when there is none
+    return next((r for r in (rules if rules is not None else local_rules()) if r["kind"] == kind), None)
+
+def add_rule(id: str, kind: str, threshold_cents: int = None, category: str = None, merchant: str = None,
+             subtype: str = None):
+    # e.g. add_rule("coffee", "budget", 6_000, category="FOOD_AND_DRINK")
+    database.upsert_alert_rule({
+        "id": id,
+        "kind": kind,
+        "threshold_cents": threshold_cents,
+        "category": category,
+        "merchant": merchant,
+        "subtype": subtype,
+        "enabled": True,
+    })
+
+
+def _cents(amount):
+    return round(amount * 100)
+
+def _month(day):
+    return str(day)[:7]
+
+def _kept_months(today=None):
+    # budget totals are kept for the current and the previous month only
+    today = today or date.today()
+    previous = date(today.year - (today.month == 1), (today.month - 2) % 12 + 1, 1)
+    return {_month(today), _month(previous)}
+
+def _alert(key, rule, message, item=None, amount_cents=None):
+    return {
+        "key": key,
+        "rule_id": rule["id"],
+        "kind": rule["kind"],
+        "item": item,
+        "message": message,
+        "amount_cents": amount_cents,
+        "fired_at": datetime.now(timezone.utc).isoformat(),
+    }
+
+def _period(gap):
+    # index of the PERIODS bucket a gap in days falls in (None = irregular)
+    for i, (lo, hi) in enumerate(zip(PERIODS["min_days"], PERIODS["max_days"])):
+        if lo <= gap <= hi:
+            return i
+    return None
+
+def _recurring(charges):
+    # charges: [[iso date, cents], ...] sorted by date, recurring when every gap falls in
+    # the same period and every amount stays within tolerance of the previous one
+    if len(charges) < SUBSCRIPTION_CHARGES:
+        return None
+    days = [date.fromisoformat(d) for d, _ in charges]
+    periods = {_period((b - a).days) for a, b in zip(days, days[1:])}
+    if len(periods) != 1 or None in periods:
+        return None
+    for (_, prev), (_, cents) in zip(charges, charges[1:]):
+        if abs(cents - prev) > max(AMOUNT_TOLERANCE_CENTS, AMOUNT_TOLERANCE_PCT * prev):
+            return None
+    return PERIODS["period"][periods.pop()]
+
+
+class ItemAlerts:
+    # rule evaluation over one item's sync: feed it every page, then save()
+    def __init__(self, item: str, rules: list, state: dict = None, today: date = None):
+        self.item = item
+        self.rules = rules
+        self.budgets = [r for r in rules if r["kind"] == "budget"]
+        self.kinds = {r["kind"]: r for r in rules}
+        self.bootstrap = state is None
+        self.state = state or {"counted": {}, "merchants": {}}
+        self.state.setdefault("charged", {})
+        self.months = _kept_months(today)
+        # "rule:YYYY-MM" -> net change of this sync to the shared budget totals
+        self.delta = {}
+        self.fired = []
+
+    def page(self, added: list, modified: list, removed: list):
+        for transaction_id in removed:
+            self._uncount(transaction_id)
+            self._uncharge(transaction_id)
+        for txn in modified:
+            self._uncount(txn["transaction_id"])
+            self._count(txn)
+            self._subscription(txn)
+        for txn in added:
+            # a replayed page (sync retried before the cursor moved) counts as a modification
+            self._uncount(txn["transaction_id"])
+            self._count(txn)
+            self._large(txn)
+            self._subscription(txn)
+
+    def _matches(self, rule, txn):
+        category = (txn.get("personal_finance_category") or {}).get("primary")
+        merchant = txn.get("merchant_name") or ""
+        if rule.get("category"):
+            return category == rule["category"]
+        return bool(rule.get("merchant")) and merchant.lower() == rule["merchant"].lower()
+
+    def _count(self, txn):
+        cents, month = _cents(txn.get("amount") or 0), _month(txn.get("date"))
+        if cents <= 0 or month not in self.months:
+            return
+        matched = [rule for rule in self.budgets if self._matches(rule, txn)]
+        if not matched:
+            return
+        self.state["counted"][txn["transaction_id"]] = [month, cents, [rule["id"] for rule in matched]]
+        for rule in matched:
+            key = f"{rule['id']}:{month}"
+            self.delta[key] = self.delta.get(key, 0) + cents
+
+    def _uncount(self, transaction_id):
+        entry = self.state["counted"].pop(transaction_id, None)
+        if entry is None:
+            return
+        month, cents, rule_ids = entry
+        for rule_id in rule_ids:
+            key = f"{rule_id}:{month}"
+            self.delta[key] = self.delta.get(key, 0) - cents
+
+    def _large(self, txn):
+        rule = self.kinds.get("large_transaction")
+        cents = _cents(txn.get("amount") or 0)
+        if rule is None or self.bootstrap or cents < rule["threshold_cents"]:
+            return
+        self.fired.append(_alert(
+            f"large:{txn['transaction_id']}", rule,
+            f"Large transaction: ${store.to_dollars(cents):,.2f} at {txn.get('merchant_name') or txn.get('name')} "
+            f"on {txn.get('date')}",
+            self.item, cents,
+        ))
+
+    def _uncharge(self, transaction_id):
+        merchant = self.state["charged"].pop(transaction_id, None)
+        if merchant is not None and merchant in self.state["merchants"]:
+            self.state["merchants"][merchant]["charges"].pop(transaction_id, None)
+
+    def _subscription(self, txn):
+        if "new_subscription" not in self.kinds:
+            return
+        transaction_id = txn["transaction_id"]
+        self._uncharge(transaction_id)
+        merchant, cents = txn.get("merchant_name"), _cents(txn.get("amount") or 0)
+        if not merchant or cents <= 0:
+            return
+        entry = self.state["merchants"].setdefault(merchant, {"charges": {}, "recurring": False})
+        entry["charges"][transaction_id] = [str(txn.get("date")), cents]
+        self.state["charged"][transaction_id] = merchant
+        # pages can come in any order, keep the latest charges by date
+        kept = sorted(entry["charges"].items(), key=lambda c: (c[1][0], c[0]))
+        for dropped, _ in kept[:-SUBSCRIPTION_CHARGES]:
+            del entry["charges"][dropped]
+            self.state["charged"].pop(dropped, None)
+        period = _recurring([charge for _, charge in kept[-SUBSCRIPTION_CHARGES:]])
+        if period is None or entry["recurring"]:
+            return
+        entry["recurring"] = True
+        if not self.bootstrap:
+            self.fired.append(_alert(
+                f"subscription:{self.item}:{merchant}", self.kinds["new_subscription"],
+                f"New {period} subscription: {merchant} (${store.to_dollars(cents):,.2f})",
+                self.item, cents,
+            ))
+
+    def _commit_budgets(self):
+        # add this sync's change to the totals of every item, fire the budgets it took
+        # over their threshold
+        rules = {rule["id"]: rule for rule in self.budgets}
+        with _budgets_lock:
+            shared = database.fetch_alert_state(BUDGETS_KEY) or {"totals": {}, "fired": []}
+            for key, change in self.delta.items():
+                before = shared["totals"].get(key, 0)
+                after = shared["totals"][key] = before + change
+                rule = rules.get(key.rsplit(":", 1)[0])
+                if rule is None or key in shared["fired"] or not before < rule["threshold_cents"] <= after:
+                    continue
+                shared["fired"].append(key)
+                if self.bootstrap:
+                    continue
+                month = key.rsplit(":", 1)[1]
+                target = rule.get("category") or rule.get("merchant")
+                self.fired.append(_alert(
+                    f"budget:{key}", rule,
+                    f"{target} spending reached ${store.to_dollars(after):,.2f} in {month} "
+                    f"(budget ${store.to_dollars(rule['threshold_cents']):,.2f})",
+                    self.item, after,
+                ))
+            # drop months that no longer count
+            shared["totals"] = {k: v for k, v in shared["totals"].items() if k.rsplit(":", 1)[1] in self.months}
+            shared["fired"] = [k for k in shared["fired"] if k.rsplit(":", 1)[1] in self.months]
+            database.save_alert_state(BUDGETS_KEY, shared)
+        self.delta = {}
+
+    def save(self):
+        if any(self.delta.values()):
+            self._commit_budgets()
+        self.state["counted"] = {k: v for k, v in self.state["counted"].items() if v[0] in self.months}
+        database.save_alert_state(self.item, self.state)
+        publish(self.fired)
+        return self.fired
+
+
+def for_item(item: str, rules: list):
+    return ItemAlerts(item, rules, database.fetch_alert_state(item))
+
+def check_balances(rules: list, accounts: list = None):
+    # balance rules over every item's accounts, fire when a balance crosses below its threshold
+    rules = [r for r in rules if r["kind"] in ("low_balance", "low_margin")]
+    if not rules:
+        return []
+    accounts = accounts if accounts is not None else database.fetch_accounts(columns="subtype,balances")
+
+    totals = {}
+    for acct in accounts:
+        current = (acct.get("balances") or {}).get("current") or 0
+        totals[acct.get("subtype")] = totals.get(acct.get("subtype"), 0) + _cents(current)
+
+    state = database.fetch_alert_state("balances") or {}
+    fired = []
+    for rule in rules:
+        if rule["kind"] == "low_margin":
+            value = totals.get("checking", 0) - totals.get("credit card", 0)
+            message = "Your checking balance is getting close to your credit balance. Consider adding funds."
+        else:
+            value = totals.get(rule["subtype"], 0)
+            message = f"{rule['subtype'].title()} balance is low"
+        below = value < rule["threshold_cents"]
+        if below and not state.get(rule["id"]):
+            fired.append(_alert(
+                f"{rule['id']}:{date.today()}", rule,
+                f"{message} (${store.to_dollars(value):,.2f})", amount_cents=value,
+            ))
+        state[rule["id"]] = below
+    database.save_alert_state("balances", state)
+    publish(fired)
+    return fired
+
+
+# --- fired alerts ---
+
+def publish(fired: list):
+    # store fired alerts in supabase and in the local copy
+    if not fired:
+        return
+    database.upsert_alerts(fired)
+    with _cache_lock:
+        _save_local(fired + recent())
+    for alert in fired:
+        print(f"Alert: {alert['message']}")
+
+def pull():
+    # local copy of the newest alerts, refreshed during revalidation
+    rows = database.fetch_alerts(RECENT_ALERTS)
+    with _cache_lock:
+        _save_local(rows)
+
+def _save_local(rows: list):
+    newest = {}
+    for row in sorted(rows, key=lambda r: r["fired_at"], reverse=True):
+        newest.setdefault(row["key"], row)
+    def write(tmp):
+        with open(tmp, "w") as f:
+            json.dump(list(newest.values())[:RECENT_ALERTS], f)
+    store.write_atomic(ALERTS_PATH, write)
+
+def recent():
+    # newest first, no network
+    try:
+        with open(ALERTS_PATH) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return []
+
+
+if __name__ == "__main__":
+    # test usage
+    for alert in recent():
+        print(alert["fired_at"], alert["message"])
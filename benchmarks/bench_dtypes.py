@@ -0,0 +1,81 @@
+import os
+import sys
+import json
+import time
+from fractions import Fraction
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import rollups
+from database import normalize_transactions
+from synthetic import generate_items
+
+# the transaction frame as the store now hands it out (int64 cents, categoricals) next
+# to the old representation (float dollars, object strings): memory, rollup aggregation
+# time and how far the float totals drift from the exact ones
+#
+#   python benchmarks/bench_dtypes.py
+
+SIZES = [100_000, 1_000_000]
+TYPES = {"saving_checking": "checking", "credit": "credit"}
+CATEGORICAL = ["account_id", "category_primary", "category_detailed", "transaction_type", "merchant_name",
+               "source", "item"]
+
+
+def legacy_frame(df):
+    # what read_transactions returned before: float amounts, plain strings
+    old = df.astype({c: object for c in CATEGORICAL})
+    old["amount"] = old.pop("amount_cents") / 100
+    return old
+
+def legacy_build(df):
+    # rollups.build before amounts were kept in cents
+    df = df.copy()
+    df["month"] = df["date"].dt.strftime("%Y-%m")
+    df["date"] = df["date"].dt.normalize()
+    df["spend"] = df["amount"].where(df["amount"] > 0, 0)
+    df["income"] = -df["amount"].where(df["amount"] < 0, 0)
+    for col in ("category_primary", "category_detailed"):
+        df[col] = df[col].astype("object").fillna("Uncategorized")
+
+    spending = df[df["amount"] > 0]
+    return {
+        "daily_category": spending.groupby(
+            ["month", "date", "source", "category_primary", "category_detailed"], as_index=False
+        )["spend"].sum(),
+        "daily_merchant": spending.groupby(
+            ["month", "date", "source", "merchant_name"], as_index=False
+        )["spend"].sum(),
+        "monthly": df.groupby(["month", "source"], as_index=False)[["spend", "income"]].sum(),
+    }
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return time.perf_counter() - start, result
+
+def megabytes(df):
+    return df.memory_usage(deep=True).sum() / 2**20
+
+
+if __name__ == "__main__":
+    print(f"{'transactions':>12} {'':>6} {'memory':>10} {'rollups':>9} {'total spend':>22} {'error vs exact':>15}")
+    for n in SIZES:
+        payloads = json.loads(json.dumps(generate_items(n), default=str))
+        new = normalize_transactions(payloads, TYPES, TYPES)
+        old = legacy_frame(new)
+        # exact total of the original decimal amounts
+        exact = sum(Fraction(str(t["amount"])) for p in payloads.values() for t in p["transactions"]
+                    if t["amount"] > 0)
+
+        old_time, old_rollups = timed(legacy_build, old)
+        new_time, new_rollups = timed(rollups.build, new)
+        # the dashboard's all-time spend: monthly rollup summed again
+        old_total = old_rollups["monthly"]["spend"].sum()
+        new_total = new_rollups["monthly"]["spend_cents"].sum()
+
+        for label, df, seconds, total in (("old", old, old_time, Fraction(old_total)),
+                                          ("new", new, new_time, Fraction(int(new_total), 100))):
+            print(f"{n:>12,} {label:>6} {megabytes(df):>8.1f}MB {seconds:>8.2f}s {float(total):>22,.2f} "
+                  f"{float(abs(total - exact)):>15.2e}")
@@ -0,0 +1,100 @@
+import os
+import sys
+import json
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import store
+from database import normalize_accounts, normalize_transactions
+from synthetic import generate_items
+
+# normalize_transactions / normalize_accounts next to the old per-row loops, on the
+# synthetic payloads after a json round trip (what transfrom_data reads from the mirror).
+# also checks both give the same store tables, on those payloads and on ragged ones
+# where some records lack fields or carry nulls
+#
+#   python benchmarks/bench_normalize.py
+
+SIZES = [10_000, 100_000, 1_000_000]
+TYPES = {"saving_checking": "checking", "credit": "credit"}
+
+
+def legacy_accounts(payloads):
+    accounts = []
+    for name, payload in payloads.items():
+        for acct in payload.get("accounts_full", []):
+            accounts.append({
+                "account_id": acct.get("account_id", f"acc_{name}"),
+                "item": name,
+                "name": acct.get("name", "Unnamed Account"),
+                "subtype": acct.get("subtype"),
+                "balance": (acct.get("balances") or {}).get("current", 0),
+            })
+    return pd.DataFrame(accounts)
+
+def legacy_transactions(payloads, types, items):
+    txns = []
+    for name in sorted(items):
+        for txn in payloads[name].get("transactions", []):
+            pf_cat = txn.get("personal_finance_category") or {}
+            txns.append({
+                "account_id": txn.get("account_id", f"acc_{name}"),
+                "date": txn.get("date"),
+                "name": txn.get("name"),
+                "amount": txn.get("amount", 0),
+                "category_primary": pf_cat.get("primary") or None,
+                "category_detailed": pf_cat.get("detailed") or None,
+                "transaction_type": txn.get("transaction_type", "unknown"),
+                "merchant_name": txn.get("merchant_name", ""),
+                "source": types[name],
+                "item": name,
+            })
+    return pd.DataFrame(txns, columns=list(txns[0]) if txns else None)
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return time.perf_counter() - start, result
+
+def ragged(payloads):
+    # the same payloads with fields dropped from / nulled in a scattered set of records
+    fields = ["merchant_name", "transaction_type", "account_id", "name", "amount", "personal_finance_category"]
+    for payload in payloads.values():
+        for i, txn in enumerate(payload["transactions"]):
+            if i % 7 == 3:
+                txn.pop(fields[i % len(fields)], None)
+            elif i % 11 == 5:
+                txn[fields[i % len(fields)]] = None
+        for i, acct in enumerate(payload["accounts_full"]):
+            acct.pop(["name", "account_id", "balances"][i % 3], None)
+    return payloads
+
+def same_accounts(payloads):
+    old = legacy_accounts(payloads)
+    old["balance_cents"] = store.to_cents(old.pop("balance").fillna(0))
+    return store._to_table(normalize_accounts(payloads), store.ACCOUNT_SCHEMA).equals(
+        store._to_table(old, store.ACCOUNT_SCHEMA))
+
+def same_tables(old, new):
+    # what the store would write for each frame (the loops predate amounts in cents)
+    old = old.assign(amount_cents=store.to_cents(old.pop("amount").fillna(0)))
+    a = store._to_table(old.drop(columns="item"), store.TRANSACTION_SCHEMA)
+    b = store._to_table(new.drop(columns="item"), store.TRANSACTION_SCHEMA)
+    return a.equals(b) and old["item"].tolist() == new["item"].tolist()
+
+
+if __name__ == "__main__":
+    print(f"{'transactions':>12} {'vectorized (s)':>15} {'legacy loop (s)':>16} {'identical':>10}")
+    for n in SIZES:
+        payloads = json.loads(json.dumps(generate_items(n), default=str))
+        new_time, new = timed(normalize_transactions, payloads, TYPES, TYPES)
+        old_time, old = timed(legacy_transactions, payloads, TYPES, TYPES)
+        print(f"{n:>12,} {new_time:15.2f} {old_time:16.2f} {str(same_tables(old, new) and same_accounts(payloads)):>10}")
+
+    payloads = ragged(json.loads(json.dumps(generate_items(SIZES[0]), default=str)))
+    same = same_tables(legacy_transactions(payloads, TYPES, TYPES), normalize_transactions(payloads, TYPES, TYPES))
+    print(f"ragged payloads identical: {same and same_accounts(payloads)}")
@@ -0,0 +1,69 @@
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from recurring import detect_recurring
+
+# how detect_recurring scales with history size, next to the old per-merchant loop
+#
+#   python benchmarks/bench_recurring.py
+
+
+def synthetic_transactions(n, merchants, seed=0):
+    # mix of monthly/weekly subscriptions and random one-off spending
+    rng = np.random.default_rng(seed)
+    n_subs = max(n // 50, 1)
+    subs = pd.DataFrame({
+        "merchant_name": [f"sub_{i % (merchants // 10 + 1)}" for i in range(n_subs)],
+        "date": pd.Timestamp("2022-01-01") + pd.to_timedelta((np.arange(n_subs) // (merchants // 10 + 1)) * 30, unit="D"),
+        "amount": 9.99,
+    })
+    noise = pd.DataFrame({
+        "merchant_name": "m_" + pd.Series(rng.integers(0, merchants, n - n_subs)).astype(str),
+        "date": pd.Timestamp("2022-01-01") + pd.to_timedelta(rng.integers(0, 3 * 365, n - n_subs), unit="D"),
+        "amount": rng.gamma(2, 20, n - n_subs).round(2),
+    })
+    return pd.concat([subs, noise], ignore_index=True)
+
+
+def legacy_detect(df):
+    # the previous supscriptions() loop, kept for comparison
+    df = df[df["amount"] > 0].copy()
+    df["year_month"] = df["date"].dt.to_period("M")
+    month_counts = df.groupby(["merchant_name", "year_month"]).size().reset_index(name="count")
+    bad_merchants = month_counts[month_counts["count"] > 1]["merchant_name"].unique()
+    df = df[~df["merchant_name"].isin(bad_merchants)]
+
+    possible_subs = []
+    for merchant_name, group in df.groupby("merchant_name"):
+        if len(group) < 2:
+            continue
+        group = group.sort_values("date")
+        group["day_diff"] = group["date"].diff().dt.days
+        group["amount_diff"] = group["amount"].diff().abs()
+        monthly_count = ((group["day_diff"] > 25) & (group["day_diff"] < 35)).sum()
+        consistent_price = (group["amount_diff"] <= 2).sum()
+        if monthly_count >= 1 and consistent_price >= 1:
+            possible_subs.append({"merchant_name": merchant_name})
+    return pd.DataFrame(possible_subs)
+
+
+def timed(fn, df):
+    start = time.perf_counter()
+    fn(df)
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    print(f"{'transactions':>12} {'merchants':>10} {'vectorized (s)':>15} {'legacy loop (s)':>16}")
+    for n, merchants in [(10_000, 2_000), (100_000, 20_000), (1_000_000, 200_000)]:
+        df = synthetic_transactions(n, merchants)
+        new = timed(detect_recurring, df)
+        # the loop needs minutes at 1M rows, skip it there
+        old = f"{timed(legacy_detect, df):16.2f}" if n <= 100_000 else f"{'skipped':>16}"
+        print(f"{n:>12,} {merchants:>10,} {new:15.2f} {old}")
@@ -0,0 +1,81 @@
+import os
+import sys
+import json
+import subprocess
+
+# peak memory of an incremental sync as the number of transactions grows.
+# every size runs in a fresh interpreter; plaid pages are generated on demand and the
+# supabase side only encodes the payloads (like the http client) and drops them, so what
+# grows with the delta is the pipeline itself
+#
+#   python benchmarks/bench_serialization.py
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SIZES = [1_000, 10_000, 50_000, 100_000]
+
+SYNC = """
+import os, sys, json, resource, time, tracemalloc
+from datetime import date, timedelta
+from fakes import FakeModel, FakeQuery, FakeResponse, FakeSupabase, fake_transaction
+import database, fetcher
+
+n = int(sys.argv[1])
+os.environ["BENCH_TOKEN"] = "access-bench"
+
+
+class PagedPlaid:
+    # transactions_sync pages built on request, nothing is kept between pages
+    def transactions_sync(self, request):
+        start = int(request.get("cursor") or 0)
+        end = min(start + request.get("count"), n)
+        added = [FakeModel(fake_transaction(f"t{i}", date(2024, 1, 1) + timedelta(days=i % 365), 10 + i % 90,
+                                            merchant=f"m{i % 500}")) for i in range(start, end)]
+        return FakeModel({"added": added, "modified": [], "removed": [], "next_cursor": str(end),
+                          "has_more": end < n, "accounts": []})
+
+    def accounts_get(self, request):
+        return FakeModel({"accounts": [], "item": FakeModel({"item_id": "bench", "institution_id": "ins_bench"})})
+
+
+class SinkQuery(FakeQuery):
+    def execute(self):
+        if self.table == "transactions" and self.action in ("upsert", "update"):
+            self.db.sent += len(json.dumps(self.payload))
+            return FakeResponse([])
+        return super().execute()
+
+
+class SinkSupabase(FakeSupabase):
+    sent = 0
+
+    def table(self, name):
+        return SinkQuery(self, name)
+
+
+db = SinkSupabase()
+database.set_supabase(db)
+baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+tracemalloc.start()
+start = time.perf_counter()
+fetcher.sync_item({"item": "bench", "token_env": "BENCH_TOKEN", "type": "checking"}, PagedPlaid())
+elapsed = time.perf_counter() - start
+_, peak = tracemalloc.get_traced_memory()
+rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({"seconds": elapsed, "peak_alloc_mb": peak / 2**20,
+                  "peak_rss_mb": rss / 1024, "rss_growth_mb": (rss - baseline) / 1024, "sent_mb": db.sent / 2**20}))
+"""
+
+
+def run(n):
+    env = {**os.environ, "PYTHONPATH": ROOT, "PYTHONWARNINGS": "ignore"}
+    out = subprocess.run([sys.executable, "-c", SYNC, str(n)], cwd=ROOT, env=env,
+                         capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+if __name__ == "__main__":
+    print(f"{'transactions':>12} {'time':>8} {'peak alloc':>11} {'peak rss':>9} {'rss growth':>11} {'sent':>8}")
+    for n in SIZES:
+        r = run(n)
+        print(f"{n:>12,} {r['seconds']:>7.2f}s {r['peak_alloc_mb']:>9.1f}MB {r['peak_rss_mb']:>7.0f}MB "
+              f"{r['rss_growth_mb']:>9.1f}MB {r['sent_mb']:>6.0f}MB")
@@ -0,0 +1,89 @@
+import os
+import sys
+import subprocess
+import tempfile
+
+# cold start timings, every measurement runs in a fresh interpreter
+#
+#   login screen  run dashboard.py (streamlit AppTest) until the password prompt
+#   first chart   import dash_functions and draw spending_per_month from a local store
+#   imports       cold import time of the heavy dependencies, for reference
+#
+#   python benchmarks/bench_startup.py
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RUNS = 3
+
+LOGIN = """
+import time
+start = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+at = AppTest.from_file("dashboard.py", default_timeout=60)
+at.run()
+assert any(e.type == "text_input" for e in at.main), "login screen not shown"
+print(time.perf_counter() - start)
+"""
+
+SEED = """
+import sys
+import numpy as np
+import pandas as pd
+import store, rollups
+store.DATA_DIR = sys.argv[1]
+store.STORE_DIR = sys.argv[1] + "/store"
+rng = np.random.default_rng(0)
+n = 20_000
+df = pd.DataFrame({
+    "account_id": "acc",
+    "date": pd.Timestamp.today().normalize() - pd.to_timedelta(rng.integers(0, 730, n), unit="D"),
+    "name": "txn",
+    "amount_cents": store.to_cents(rng.normal(30, 60, n)),
+    "category_primary": rng.choice(["FOOD_AND_DRINK", "TRAVEL", "GENERAL_MERCHANDISE"], n),
+    "category_detailed": None,
+    "transaction_type": "place",
+    "merchant_name": "m_" + pd.Series(rng.integers(0, 300, n)).astype(str),
+    "source": rng.choice(["checking", "credit"], n),
+    "item": "saving_checking",
+})
+with store.batch():
+    rollups.update(store.write_transactions(df))
+"""
+
+FIRST_CHART = """
+import sys, time
+start = time.perf_counter()
+import store
+store.DATA_DIR = sys.argv[1]
+store.STORE_DIR = sys.argv[1] + "/store"
+import dash_functions, render_cache
+dash_functions.spending_per_month()
+assert render_cache.stats["misses"] == 1, "chart was not drawn"
+print(time.perf_counter() - start)
+"""
+
+IMPORT = """
+import time
+start = time.perf_counter()
+import {module}
+print(time.perf_counter() - start)
+"""
+
+
+def run(code, *args):
+    env = {**os.environ, "PYTHONPATH": ROOT, "PYTHONWARNINGS": "ignore"}
+    out = subprocess.run([sys.executable, "-c", code, *args], cwd=ROOT, env=env,
+                         capture_output=True, text=True, check=True)
+    return float(out.stdout.strip().splitlines()[-1])
+
+def best_of(code, *args):
+    return min(run(code, *args) for _ in range(RUNS))
+
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as data_dir:
+        run(SEED + "\nprint(0)", data_dir)
+        print(f"{'time to login screen':<24} {best_of(LOGIN):6.2f}s")
+        print(f"{'time to first chart':<24} {best_of(FIRST_CHART, data_dir):6.2f}s")
+
+    for module in ["streamlit", "pandas", "pyarrow.dataset", "matplotlib.pyplot", "plaid.api", "supabase"]:
+        print(f"{'import ' + module:<24} {best_of(IMPORT.format(module=module)):6.2f}s")
@@ -0,0 +1,59 @@
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import trends
+from database import normalize_transactions
+from synthetic import generate_items
+
+# trends.detect_anomalies (one grouped pass) next to a per-merchant loop of pandas
+# rolling windows computing the same statistics, over multi-year synthetic histories
+# with thousands of merchants. also checks both flag the same charges
+#
+#   python benchmarks/bench_trends.py
+
+SIZES = [(100_000, 2_000), (1_000_000, 5_000)]
+TYPES = {"saving_checking": "checking", "credit": "credit"}
+DAYS = 3 * 365
+
+
+def legacy_anomalies(df, by="merchant_name"):
+    # one rolling median / MAD per merchant (the EWMA is informational, it never flags)
+    df = df[df[by].notna() & (df["amount_cents"] > 0)]
+    flagged = []
+    for _, group in df.sort_values("date", kind="stable").groupby(by, observed=True):
+        amounts = group["amount_cents"].astype(float)
+        previous = amounts.shift().rolling(trends.WINDOW, min_periods=1)
+        median = previous.median()
+        mad = previous.apply(lambda w: np.nanmedian(np.abs(w - np.nanmedian(w))), raw=True)
+        history = np.minimum(np.arange(len(group)), trends.WINDOW)
+        score = (amounts - median) / np.maximum(trends.MAD_SCALE * mad, 1.0)
+        unusual = ((history >= trends.MIN_HISTORY) & (score > trends.THRESHOLD)
+                   & (amounts - median >= trends.MIN_EXCESS_CENTS))
+        flagged.append(group[unusual.to_numpy()])
+    return pd.concat(flagged) if flagged else df.iloc[:0]
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return time.perf_counter() - start, result
+
+
+if __name__ == "__main__":
+    print(f"{'transactions':>12} {'merchants':>10} {'vectorized (s)':>15} {'legacy loop (s)':>16} "
+          f"{'flagged':>8} {'identical':>10}")
+    for n, merchants in SIZES:
+        df = normalize_transactions(generate_items(n, merchants=merchants, days=DAYS), TYPES, TYPES)
+        new_time, new = timed(trends.detect_anomalies, df)
+        old_time, old = timed(legacy_anomalies, df)
+        key = ["date", "merchant_name", "amount_cents"]
+        same = (new[key].astype({"merchant_name": str}).sort_values(key, ignore_index=True)
+                .equals(old[key].astype({"merchant_name": str}).sort_values(key, ignore_index=True)))
+        print(f"{n:>12,} {df['merchant_name'].nunique():>10,} {new_time:15.2f} {old_time:16.2f} "
+              f"{len(new):>8,} {str(same):>10}")
@@ -0,0 +1,53 @@
+import os
+import sys
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+import snapshots
+from fakes import FakeSupabase
+
+# snapshot bookkeeping against the fake supabase: items whose names start with another
+# item's name ("credit" / "credit_2") never touch each other's rows. exits non-zero
+# on the first check that fails
+#
+#   python benchmarks/check_snapshots.py
+
+ITEMS = ["credit", "credit_2"]
+
+
+def seed(db):
+    # three daily snapshots per item
+    for item in ITEMS:
+        for day in (1, 2, 3):
+            db.table("json_data").insert({
+                "name": snapshots.snapshot_name(item, date(2025, 1, day)),
+                "timestamp": f"2025-01-0{day}T12:00:00",
+                "encoding": snapshots.FULL,
+                "blob": snapshots.pack({"transactions": []}),
+                "depth": 0,
+            }).execute()
+
+def check_compaction(db):
+    # retention only ever touches the rows of the item it is asked about
+    database.compact_snapshots(["credit"], today=date(2025, 6, 1))
+    names = sorted(row["name"] for row in db.tables["json_data"])
+    assert names == ["credit_20250103", "credit_2_20250101", "credit_2_20250102", "credit_2_20250103"], names
+    return names
+
+def check_latest_meta(db):
+    # one query for all items, each gets its own newest row
+    requests_before = db.requests
+    latest = {item: meta["name"] for item, meta in database.fetch_latest_meta(ITEMS).items()}
+    assert latest == {"credit": "credit_20250103", "credit_2": "credit_2_20250103"}, latest
+    assert db.requests - requests_before == 1, db.requests - requests_before
+    return latest
+
+
+if __name__ == "__main__":
+    db = FakeSupabase()
+    database.set_supabase(db)
+    seed(db)
+    print(f"newest snapshots: {check_latest_meta(db)}")
+    print(f"compaction of 'credit' left: {check_compaction(db)}")
@@ -0,0 +1,249 @@
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import resource
+import tempfile
+import subprocess
+import tracemalloc
+from datetime import date, datetime, timedelta
+
+# end-to-end benchmark of the data pipeline on synthetic data (synthetic.py), with
+# fakes.FakePlaidClient and fakes.FakeSupabase standing in for the services
+#
+#   python benchmarks/suite.py                        1k, 10k and 100k transactions
+#   python benchmarks/suite.py --sizes 1000000        a million
+#   python benchmarks/suite.py --compare OLD NEW      two result files side by side
+#
+# every size runs twice in a fresh interpreter, once for wall time and once under
+# tracemalloc for peak python/numpy memory (tracemalloc slows the code down a lot, so
+# the two are never mixed). arrow buffers are invisible to tracemalloc, the process
+# high-water mark after each case is recorded as rss. cold import costs are left out
+# (see bench_startup.py). results go to benchmarks/results/<date>-<commit>.json
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+SIZES = [1_000, 10_000, 100_000]
+
+CHARTS = ["spending_per_month", "spending_per_cat", "spending_per_cat_pie", "spending_per_merchant",
+          "income_expenses"]
+
+
+def cases(data_dir, n, merchants, recurring):
+    # (name, fn) in pipeline order, each case builds on the state the previous ones left
+    sys.path.insert(0, ROOT)
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    os.environ.setdefault("PLAID_ACCESS_TOKEN", "access-bench")
+    os.environ.setdefault("PLAID_ACCESS_TOKEN_CREDIT", "access-bench-credit")
+
+    import logging
+    logging.getLogger("streamlit").setLevel(logging.ERROR)
+
+    import pandas as pd
+    # as in dashboard.py, the charts rely on it
+    pd.set_option("mode.copy_on_write", True)
+
+    import store
+    import alerts
+    import trends
+    import database
+    import fetcher
+    import registry
+    import rollups
+    import search
+    import render_cache
+    import dash_functions
+    from recurring import detect_recurring
+    from fakes import FakePlaidClient, FakeSupabase
+    from synthetic import generate_items
+
+    # imports that would otherwise land in the first case that needs them
+    import pyarrow.dataset  # noqa: F401 (warm-up, keeps its import cost out of the first case)
+    render_cache.pyplot()
+
+    store.DATA_DIR = data_dir
+    store.STORE_DIR = os.path.join(data_dir, "store")
+    database.MIRROR_PATH = os.path.join(data_dir, "mirror.sqlite")
+    database.SNAPSHOT_CACHE_DIR = os.path.join(data_dir, "cache", "snapshots")
+    alerts.ALERTS_PATH = os.path.join(data_dir, "alerts.json")
+    alerts.RULES_PATH = os.path.join(data_dir, "alert_rules.json")
+    database.set_supabase(FakeSupabase())
+
+    # data ends today so the "last 30 days" charts have something to draw
+    payloads = generate_items(n, merchants=merchants, recurring=recurring, end=date.today())
+    clients = {
+        name: FakePlaidClient(p["transactions"], p["accounts_full"], p["item"])
+        for name, p in payloads.items()
+    }
+    items = registry.DEFAULT_ITEMS
+    state = {}
+
+    def fetch_full():
+        for item in items:
+            fetcher.fetch_all_data(item["token_env"], clients[item["item"]])
+
+    def fetch_sync():
+        for item in items:
+            for _ in fetcher.sync_transactions(item["token_env"], None, clients[item["item"]]):
+                pass
+
+    def save():
+        for item in items:
+            fetcher.sync_item(item, clients[item["item"]])
+
+    def transform():
+        database.transfrom_data()
+
+    def load():
+        dash_functions._data_cache.clear()
+        _, checking, credit = dash_functions.read_data()
+        state["frames"] = (checking, credit)
+
+    def rollups_build():
+        rollups.update()
+
+    def chart(name):
+        # the dashboard's default range, the last 30 days
+        def draw():
+            render_cache.clear()
+            getattr(dash_functions, name)(date.today() - timedelta(days=30), date.today())
+        return draw
+
+    def subscriptions():
+        checking, credit = state["frames"]
+        import pandas as pd
+        df = pd.concat([credit, checking], ignore_index=True)
+        detect_recurring(df.assign(amount=store.to_dollars(df["amount_cents"])))
+
+    def anomalies():
+        checking, credit = state["frames"]
+        import pandas as pd
+        trends.detect_anomalies(pd.concat([credit, checking], ignore_index=True))
+
+    def search_build():
+        os.remove(search.index_path())
+        search.update()
+
+    def search_query():
+        search.search("merchant 000")
+        search.search(category="FOOD_AND_DRINK", sort="amount")
+
+    return [
+        ("fetch (full)", fetch_full),
+        ("fetch (sync)", fetch_sync),
+        ("save", save),
+        ("transform", transform),
+        ("load", load),
+        ("rollups", rollups_build),
+        *[(f"chart {name}", chart(name)) for name in CHARTS],
+        ("subscriptions", subscriptions),
+        ("unusual charges", anomalies),
+        ("search index", search_build),
+        ("search query", search_query),
+    ]
+
+def worker(n, memory, merchants, recurring):
+    # runs in its own interpreter, prints one json line per case
+    with tempfile.TemporaryDirectory() as data_dir, open(os.devnull, "w") as devnull:
+        for name, fn in cases(data_dir, n, merchants, recurring):
+            stdout, sys.stdout = sys.stdout, devnull  # the pipeline prints progress
+            try:
+                if memory:
+                    tracemalloc.start()
+                    fn()
+                    value = tracemalloc.get_traced_memory()[1] / 2**20
+                    tracemalloc.stop()
+                else:
+                    start = time.perf_counter()
+                    fn()
+                    value = time.perf_counter() - start
+            finally:
+                sys.stdout = stdout
+            row = {"case": name, "peak_mb" if memory else "seconds": value}
+            if not memory:
+                row["rss_mb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+            print(json.dumps(row), flush=True)
+
+def run_size(n, merchants, recurring):
+    results = {}
+    for memory in (False, True):
+        cmd = [sys.executable, os.path.abspath(__file__), "--worker", str(n),
+               "--merchants", str(merchants), "--recurring", str(recurring)]
+        if memory:
+            cmd.append("--memory")
+        env = {**os.environ, "PYTHONWARNINGS": "ignore"}
+        out = subprocess.run(cmd, cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+        for line in out.stdout.splitlines():
+            row = json.loads(line)
+            results.setdefault(row.pop("case"), {}).update(row)
+    return results
+
+def commit():
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True)
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=ROOT,
+                               capture_output=True, text=True).stdout.strip()
+        return out.stdout.strip() + ("-dirty" if dirty else "")
+    except OSError:
+        return "unknown"
+
+def print_table(report):
+    print(f"{'case':<32} {'transactions':>12} {'time':>9} {'peak mem':>10} {'rss':>8}")
+    for row in report["results"]:
+        print(f"{row['case']:<32} {row['size']:>12,} {row['seconds']:>8.3f}s {row['peak_mb']:>8.1f}MB "
+              f"{row['rss_mb']:>6.0f}MB")
+
+def compare(old_path, new_path):
+    with open(old_path) as f:
+        old = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+    before = {(r["case"], r["size"]): r for r in old["results"]}
+    print(f"{old['commit']} -> {new['commit']}")
+    print(f"{'case':<32} {'transactions':>12} {'time':>20} {'peak mem':>22}")
+    for row in new["results"]:
+        prev = before.get((row["case"], row["size"]))
+        if prev is None:
+            continue
+        time_ratio = row["seconds"] / prev["seconds"] if prev["seconds"] else float("nan")
+        mem_ratio = row["peak_mb"] / prev["peak_mb"] if prev["peak_mb"] else float("nan")
+        print(f"{row['case']:<32} {row['size']:>12,} "
+              f"{prev['seconds']:>7.3f}s->{row['seconds']:>7.3f}s {time_ratio:>4.2f}x "
+              f"{prev['peak_mb']:>7.1f}->{row['peak_mb']:>7.1f}MB {mem_ratio:>4.2f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES)
+    parser.add_argument("--merchants", type=int, default=500)
+    parser.add_argument("--recurring", type=int, default=20)
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"))
+    parser.add_argument("--worker", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--memory", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+    elif args.worker:
+        worker(args.worker, args.memory, args.merchants, args.recurring)
+    else:
+        report = {
+            "commit": commit(),
+            "date": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "merchants": args.merchants,
+            "recurring": args.recurring,
+            "results": [],
+        }
+        for n in args.sizes:
+            for case, row in run_size(n, args.merchants, args.recurring).items():
+                report["results"].append({"case": case, "size": n, **row})
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        path = os.path.join(RESULTS_DIR, f"{date.today():%Y%m%d}-{report['commit']}.json")
+        with open(path, "w") as f:
+            json.dump(report, f, indent=2)
+        print_table(report)
+        print(f"results saved to {os.path.relpath(path, ROOT)}")
@@ -0,0 +1,123 @@
+from datetime import date, timedelta
+
+import numpy as np
+
+# deterministic plaid-shaped payloads for benchmarks: the same arguments always give
+# the same transactions, so results can be compared across commits
+#
+#   generate(10_000)                       one item, {"transactions", "accounts_full", "item"}
+#   generate_items(1_000_000)              the default two items, split 1:3 checking:credit
+#
+# spending is random one-off purchases over `merchants` merchants, plus `recurring`
+# subscriptions (weekly / monthly / quarterly / annual, stable amounts) and biweekly
+# paychecks on checking items.
+
+CATEGORIES = {
+    "FOOD_AND_DRINK": ["FOOD_AND_DRINK_COFFEE", "FOOD_AND_DRINK_RESTAURANT", "FOOD_AND_DRINK_GROCERIES"],
+    "GENERAL_MERCHANDISE": ["GENERAL_MERCHANDISE_ONLINE_MARKETPLACES", "GENERAL_MERCHANDISE_SUPERSTORES",
+                            "GENERAL_MERCHANDISE_CLOTHING_AND_ACCESSORIES"],
+    "TRANSPORTATION": ["TRANSPORTATION_GAS", "TRANSPORTATION_TAXIS_AND_RIDE_SHARES"],
+    "ENTERTAINMENT": ["ENTERTAINMENT_TV_AND_MOVIES", "ENTERTAINMENT_MUSIC_AND_AUDIO"],
+    "TRAVEL": ["TRAVEL_FLIGHTS", "TRAVEL_LODGING"],
+    "PERSONAL_CARE": ["PERSONAL_CARE_GYMS_AND_FITNESS_CENTERS", "PERSONAL_CARE_HAIR_AND_BEAUTY"],
+}
+PERIODS = {"weekly": 7, "monthly": 30, "quarterly": 91, "annual": 365}
+
+ACCOUNTS = {
+    "checking": [("Checking", "depository", "checking", 2500.0), ("Savings", "depository", "savings", 12000.0)],
+    "credit": [("Credit Card", "credit", "credit card", 850.0)],
+}
+
+
+def _transaction(item, i, account_id, day, amount, merchant, category, detailed, kind="place"):
+    return {
+        "transaction_id": f"{item}_{i:08d}",
+        "account_id": account_id,
+        "date": day,
+        "authorized_date": day,
+        "name": merchant.upper() if merchant else "TRANSFER",
+        "merchant_name": merchant,
+        "amount": amount,
+        "iso_currency_code": "USD",
+        "transaction_type": kind,
+        "payment_channel": "in store" if kind == "place" else "other",
+        "pending": False,
+        "personal_finance_category": {"primary": category, "detailed": detailed, "confidence_level": "HIGH"},
+    }
+
+def generate(n, item="credit", type="credit", merchants=500, recurring=20, days=730,
+             end=date(2025, 1, 1), seed=0):
+    # one plaid item with n transactions ending at `end`, newest first like plaid returns them
+    rng = np.random.default_rng(seed)
+    accounts = [{
+        "account_id": f"acc_{item}_{k}",
+        "name": name,
+        "type": acct_type,
+        "subtype": subtype,
+        "mask": f"{1000 + k}",
+        "balances": {"current": balance, "available": balance, "iso_currency_code": "USD", "limit": None},
+    } for k, (name, acct_type, subtype, balance) in enumerate(ACCOUNTS[type])]
+    spend_account = accounts[0]["account_id"]
+
+    transactions = []
+    start = end - timedelta(days=days - 1)
+
+    # paychecks every other friday on checking items
+    if type == "checking":
+        for d in range(0, days, 14):
+            if len(transactions) >= n // 20:
+                break
+            transactions.append(_transaction(item, len(transactions), spend_account, start + timedelta(days=d),
+                                             -2100.0, "Payroll", "INCOME", "INCOME_WAGES", "special"))
+
+    # subscriptions at a fixed period and amount, capped at a fifth of the transactions
+    budget = n // 5
+    for s in range(recurring):
+        period = list(PERIODS.values())[s % len(PERIODS)]
+        amount = float(round(rng.choice([4.99, 9.99, 14.99, 29.99, 49.0, 99.0]), 2))
+        first = int(rng.integers(0, period))
+        category = "ENTERTAINMENT" if s % 2 else "PERSONAL_CARE"
+        for d in range(first, days, period):
+            if budget <= 0:
+                break
+            transactions.append(_transaction(item, len(transactions), spend_account, start + timedelta(days=d),
+                                             amount, f"Subscription {s:03d}", category, CATEGORIES[category][0],
+                                             "digital"))
+            budget -= 1
+
+    # the rest is one-off spending, merchants drawn with a long tail
+    rest = n - len(transactions)
+    merchant_ids = np.minimum(rng.zipf(1.3, rest) - 1, merchants - 1)
+    offsets = rng.integers(0, days, rest)
+    amounts = np.round(rng.gamma(2.0, 18.0, rest), 2)
+    primaries = list(CATEGORIES)
+    merchant_primary = rng.integers(0, len(primaries), merchants)
+    detailed_pick = rng.integers(0, 3, rest)
+    for m, d, a, k in zip(merchant_ids.tolist(), offsets.tolist(), amounts.tolist(), detailed_pick.tolist()):
+        primary = primaries[merchant_primary[m]]
+        detailed = CATEGORIES[primary][k % len(CATEGORIES[primary])]
+        transactions.append(_transaction(item, len(transactions), spend_account, start + timedelta(days=d),
+                                         a, f"Merchant {m:05d}", primary, detailed))
+
+    transactions.sort(key=lambda t: (t["date"], t["transaction_id"]), reverse=True)
+    return {
+        "transactions": transactions,
+        "accounts_full": accounts,
+        "item": {"item_id": f"item_{item}", "institution_id": f"ins_{item}"},
+    }
+
+def generate_items(n, merchants=500, recurring=20, days=730, end=date(2025, 1, 1), seed=0):
+    # the two default items (see registry.DEFAULT_ITEMS), a quarter of the rows on checking
+    n_checking = n // 4
+    return {
+        "saving_checking": generate(n_checking, "saving_checking", "checking", merchants, recurring // 4,
+                                    days, end, seed),
+        "credit": generate(n - n_checking, "credit", "credit", merchants, recurring, days, end, seed + 1),
+    }
+
+
+if __name__ == "__main__":
+    # test usage
+    payloads = generate_items(1_000)
+    for name, payload in payloads.items():
+        print(name, len(payload["transactions"]), payload["transactions"][0])
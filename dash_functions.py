@@ -1,28 +1,140 @@
 import json
 import pandas as pd
-import os
-from glob import glob
+import threading
 import streamlit as st
-import matplotlib.pyplot as plt
-from datetime import datetime, timedelta
+from datetime import datetime, date, timedelta
+
+import store
+import alerts
+import render_cache
+import rollups
+import search
+import tracing
+import trends
+from recurring import detect_recurring
+
+
+# process-wide cache of typed frames and rollups, reloaded only when the store version changes
+_data_cache = {}
+_data_cache_lock = threading.Lock()
+
+def cached(key, loader):
+    version = store.data_version()
+    with _data_cache_lock:
+        entry = _data_cache.get(key)
+        if entry is None or entry[0] != version or version is None:
+            entry = (version, loader())
+            _data_cache[key] = entry
+        return entry[1]
+
+# --- date index ---
+# cached frames are kept sorted by date next to an index of their dates, so a date
+# window is two binary searches and a slice instead of a mask over every row
+
+class DateIndexed:
+    def __init__(self, df, column="date"):
+        self.column = column
+        self.df = df.sort_values(column, kind="stable").reset_index(drop=True)
+        self.keys = pd.Index(self.df[column])
+
+    def _key(self, day):
+        # monthly tables are keyed by "YYYY-MM" strings, the rest by timestamps
+        day = pd.Timestamp(day).normalize()
+        return day.strftime("%Y-%m") if self.column == "month" else day
+
+    def window(self, start=None, end=None):
+        # rows with start <= date <= end (whole days, either side open when None)
+        lo = 0 if start is None else self.keys.searchsorted(self._key(start), side="left")
+        hi = len(self.keys) if end is None else self.keys.searchsorted(self._key(end), side="right")
+        return self.df.iloc[lo:hi]
+
+def load_data():
+    def load():
+        with tracing.span("read_data") as s:
+            accounts = store.read_accounts()
+            checking, credit = (store.read_transactions(source=source) for source in ("checking", "credit"))
+            frames = (
+                accounts,
+                DateIndexed(checking) if checking is not None else None,
+                DateIndexed(credit) if credit is not None else None,
+            )
+            s.set(rows=sum(len(df) for df in (accounts, checking, credit) if df is not None))
+        return frames
+    return cached("frames", load)
 
+def read_data(start=None, end=None, columns=None):
+    # latest data from the local store (optionally only transactions between start and end).
+    # the frames share memory with the cache, the app runs with copy-on-write (see
+    # dashboard.py) so one chart's column edits don't leak into the next one
+    df_accounts, df_checking, df_credit = load_data()
 
-def read_data():
-    folder = "data"
+    if df_accounts is None or df_checking is None:
+        print("No data found in local store")
 
-    def get_latest_csv(prefix):
-        files = glob(os.path.join(folder, f"{prefix}_*.csv"))
-        if not files:
-            print(f"No files found for prefix: {prefix}")
+    def view(indexed):
+        if indexed is None:
             return None
-        files.sort(reverse=True) # sort by date and prefix escending
-        return pd.read_csv(files[0]) 
-
-    df_accounts = get_latest_csv("accounts")
-    df_checking = get_latest_csv("checking_transactions")
-    df_credit = get_latest_csv("credit_transactions")
-
-    return df_accounts, df_checking, df_credit
+        df = indexed.window(start, end)
+        if columns is not None:
+            df = df[columns]
+        return df.copy(deep=False)
+
+    accounts = df_accounts.copy(deep=False) if df_accounts is not None else None
+    return accounts, view(df_checking), view(df_credit)
+
+def read_rollup(name, source=None, start=None, end=None):
+    # pre-aggregated totals (see rollups.py), optionally for one source / between start and end
+    def load():
+        df = rollups.read(name)
+        if df is None:
+            return None
+        if source is not None:
+            df = df[df["source"] == source]
+        return DateIndexed(df, "date" if "date" in df else "month")
+
+    indexed = cached(("rollup", name, source), load)
+    if indexed is None:
+        return None
+    return indexed.window(start, end).copy(deep=False)
+
+
+# --- date range ---
+
+DATE_RANGES = {
+    "Last 30 days": lambda today: today - timedelta(days=30),
+    "Last 90 days": lambda today: today - timedelta(days=90),
+    "Last 12 months": lambda today: today - timedelta(days=365),
+    "This year": lambda today: today.replace(month=1, day=1),
+    "All time": lambda today: None,
+}
+
+def date_range_picker():
+    # one range for every chart, kept in the session across pages
+    choice = st.sidebar.selectbox("Date range", [*DATE_RANGES, "Custom"], key="date_range_choice")
+    today = date.today()
+    if choice != "Custom":
+        return DATE_RANGES[choice](today), today
+    dates = st.sidebar.date_input("From / to", value=(today - timedelta(days=30), today), key="date_range_custom")
+    # the picker hands back one date while the second one is being chosen
+    start = dates[0] if len(dates) > 0 else None
+    end = dates[1] if len(dates) > 1 else today
+    return start, end
+
+def range_label(start, end):
+    if start is None:
+        return "all time"
+    if end == date.today():
+        return f"since {start:%b %d, %Y}"
+    return f"{start:%b %d, %Y} to {end:%b %d, %Y}"
+
+def show_chart(name, plot, **params):
+    # finished charts are cached as png, keyed by data version + chart + parameters
+    key = (store.data_version(), name, tuple(sorted(params.items())))
+    with tracing.span("chart", chart=name) as s:
+        png = render_cache.render_png(key, plot)
+        s.set(bytes=len(png) if png else 0)
+    if png is not None:
+        st.image(png, use_container_width=True)
 
 # credit vs checking
 def credit_checking():
@@ -33,19 +145,31 @@ def credit_checking():
         st.warning("No accounts data found.")
         return
     
-    credit = df_accounts[df_accounts["subtype"] == "credit card"]["balance"].sum()
-    checking = df_accounts[df_accounts["subtype"] == "checking"]["balance"].sum()
+    credit = store.to_dollars(df_accounts[df_accounts["subtype"] == "credit card"]["balance_cents"].sum())
+    checking = store.to_dollars(df_accounts[df_accounts["subtype"] == "checking"]["balance_cents"].sum())
     difference = checking - credit
 
     st.metric("Checking Balance", f"${checking:,.2f}")
     st.metric("Credit Card Balance", f"${credit:,.2f}")
     st.success(f"**Difference: ${difference:,.2f}**")
 
-    # warning if checking is low
-    if difference < 150:
+    # warning if checking is low, threshold from the low_margin alert rule
+    margin = alerts.rule("low_margin")
+    if margin is not None and round(difference * 100) < margin["threshold_cents"]:
         st.error("⚠️ Your checking balance is getting close to your credit balance. Consider adding funds.")
 
 
+# alerts fired during syncs (see alerts.py), from the local copy
+def recent_alerts(limit=10):
+    fired = alerts.recent()[:limit]
+    if not fired:
+        st.info("No alerts.")
+        return
+    for alert in fired:
+        when = datetime.fromisoformat(alert["fired_at"]).astimezone().strftime("%b %d, %I:%M %p")
+        st.warning(f"{alert['message']}  \n_{when}_")
+
+
 #net worth
 def net_worth():
     df_accounts, _, _ = read_data()
@@ -55,9 +179,9 @@ def net_worth():
         st.warning("No accounts data found.")
         return
 
-    savings = df_accounts[df_accounts["subtype"] == "savings"]["balance"].sum()
-    credit = df_accounts[df_accounts["subtype"] == "credit card"]["balance"].sum()
-    checking = df_accounts[df_accounts["subtype"] == "checking"]["balance"].sum()
+    savings = store.to_dollars(df_accounts[df_accounts["subtype"] == "savings"]["balance_cents"].sum())
+    credit = store.to_dollars(df_accounts[df_accounts["subtype"] == "credit card"]["balance_cents"].sum())
+    checking = store.to_dollars(df_accounts[df_accounts["subtype"] == "checking"]["balance_cents"].sum())
 
     net_worth = savings + checking - credit
     st.metric("Savings", f"${savings:,.2f}")
@@ -66,194 +190,212 @@ def net_worth():
     st.success(f"**Net Worth: ${net_worth:,.2f}**")
 
 # spedning per month
-def spending_per_month():
-    _, _, df_credit = read_data()
+def spending_per_month(start=None, end=None):
+    monthly = read_rollup("monthly", source="credit", start=start, end=end)
 
     # error check
-    if df_credit is None or df_credit.empty:
+    if monthly is None or monthly.empty:
         st.warning("No credit card transaction data found.")
         return
-    
-    # datetime format
-    df_credit["date"] = pd.to_datetime(df_credit["date"])
-
-    # filter for only (+) amounts 
-    df_credit = df_credit[df_credit["amount"] > 0]
-
-    # convert to positive for spending (safegaurd)
-    df_credit["spending"] = df_credit["amount"].abs()
 
-    # format month
-    df_credit["month"] = df_credit["date"].dt.strftime("%b %Y")
+    # spend per month (only (+) amounts, already summed in the rollup)
+    monthly_spend = monthly[monthly["spend_cents"] > 0].sort_values("month")
+    monthly_spend["month"] = pd.to_datetime(monthly_spend["month"]).dt.strftime("%b %Y")
+    monthly_spend["spending"] = store.to_dollars(monthly_spend["spend_cents"])
 
-    # group by month
-    monthly_spend = df_credit.groupby("month")["spending"].sum().reset_index()
+    # plot (only on a render cache miss)
+    def plot():
+        plt = render_cache.pyplot()
+        fig, ax = plt.subplots(figsize=(10, 6))
+        bars = ax.bar(monthly_spend["month"], monthly_spend["spending"], color="#007BFF")
 
-    # plot
-    fig, ax = plt.subplots(figsize=(10, 6))
-    bars = ax.bar(monthly_spend["month"], monthly_spend["spending"], color="#007BFF")
-
-    # spending labels on top of bars
-    for bar in bars:
-        height = bar.get_height()
-        ax.annotate(f"${height:,.0f}",
-                    xy=(bar.get_x() + bar.get_width() / 2, height),
-                    xytext=(0, 5),
-                    textcoords="offset points",
-                    ha='center', va='bottom', fontsize=10)
+        # spending labels on top of bars
+        for bar in bars:
+            height = bar.get_height()
+            ax.annotate(f"${height:,.0f}",
+                        xy=(bar.get_x() + bar.get_width() / 2, height),
+                        xytext=(0, 5),
+                        textcoords="offset points",
+                        ha='center', va='bottom', fontsize=10)
 
-    ax.set_ylabel("Amount ($)")
+        ax.set_ylabel("Amount ($)")
     
-    ax.spines['right'].set_visible(False)
-    ax.spines['top'].set_visible(False)
-    ax.spines['left'].set_visible(False)
-    ax.spines['bottom'].set_visible(False)
+        ax.spines['right'].set_visible(False)
+        ax.spines['top'].set_visible(False)
+        ax.spines['left'].set_visible(False)
+        ax.spines['bottom'].set_visible(False)
 
-    ax.set_xlabel("Month")
-    plt.xticks()
-    plt.tight_layout()
+        ax.set_xlabel("Month")
+        plt.xticks()
+        plt.tight_layout()
 
-    st.pyplot(fig)
+        return fig
 
-#spending per category (last 30 days)
-def spending_per_cat():
-    _, _, df_credit = read_data()
+    show_chart("spending_per_month", plot, start=start, end=end)
+
+#spending per category (selected date range)
+def spending_per_cat(start=None, end=None):
+    in_range = read_rollup("daily_category", source="credit", start=start, end=end)
 
     # error check
-    if df_credit is None:
+    if in_range is None:
         st.warning("No credit card data found.")
         return
 
-    # datetime and filter last 30 days
-    df_credit["date"] = pd.to_datetime(df_credit["date"])
-    last_30 = df_credit[df_credit["date"] >= datetime.today() - timedelta(days=30)]
-
-    # keep only (+) amounts 
-    last_30 = last_30[last_30["amount"] > 0].copy()
-
-    # parse category string (assumes format like "['Shopping', 'Clothing']")
-    last_30["category"] = last_30["category"].apply(
-        lambda x: eval(x)[0] if pd.notnull(x) and len(eval(x)) > 0 else "Uncategorized"
-    )
-
     # group by category and sum
-    category_spend = last_30.groupby("category")["amount"].sum()
+    category_spend = store.to_dollars(in_range.groupby("category_primary", observed=True)["spend_cents"].sum())
     category_spend = category_spend.sort_values()
 
     # error check
     if category_spend.empty:
-        st.info("No credit card transactions in the last 30 days.")
+        st.info("No credit card transactions in this date range.")
         return
 
-    # plot 
-    fig, ax = plt.subplots(figsize=(10, 6))
+    # plot (only on a render cache miss)
+    def plot():
+        plt = render_cache.pyplot()
+        fig, ax = plt.subplots(figsize=(10, 6))
+
+        bars = ax.barh(category_spend.index, category_spend.values, color="#FF5733")
+        ax.set_xlabel("Amount ($)")
 
-    bars = ax.barh(category_spend.index, category_spend.values, color="#FF5733")
-    ax.set_xlabel("Amount ($)")
+        # labels 
+        for bar in bars:
+            width = bar.get_width()
+            ax.text(width + 5, bar.get_y() + bar.get_height()/2, f"${width:,.0f}",
+                    va='center', fontsize=9)
 
-    # labels 
-    for bar in bars:
-        width = bar.get_width()
-        ax.text(width + 5, bar.get_y() + bar.get_height()/2, f"${width:,.0f}",
-                va='center', fontsize=9)
+        ax.spines['right'].set_visible(False)
+        ax.spines['top'].set_visible(False)
+        ax.spines['left'].set_visible(False)
+        ax.spines['bottom'].set_visible(False)
 
-    ax.spines['right'].set_visible(False)
-    ax.spines['top'].set_visible(False)
-    ax.spines['left'].set_visible(False)
-    ax.spines['bottom'].set_visible(False)
+        plt.tight_layout()
+        return fig
 
-    plt.tight_layout()
-    st.pyplot(fig)
+    show_chart("spending_per_cat", plot, start=start, end=end)
 
-#spending per category pie (last 30 days)
-def spending_per_cat_pie():
-    _, _, df_credit = read_data()
+#spending per category pie (selected date range)
+def spending_per_cat_pie(start=None, end=None):
+    in_range = read_rollup("daily_category", source="credit", start=start, end=end)
 
-    if df_credit is None:
+    if in_range is None:
         st.warning("Credit transaction data not available.")
         return
 
-    # datetime and filter last 30 days
-    df_credit["date"] = pd.to_datetime(df_credit["date"])
-    last_30 = df_credit[df_credit["date"] >= datetime.today() - timedelta(days=30)]
+    # group by category and sum
+    spending = store.to_dollars(in_range.groupby("category_primary", observed=True)["spend_cents"].sum())
 
-    # keep only (+) amounts 
-    last_30 = last_30[last_30["amount"] > 0].copy()
+    if spending.empty:
+        st.info("No spending activity in this date range.")
+        return
 
-    # parse category string (assumes format like "['Shopping', 'Clothing']")
-    last_30["category"] = last_30["category"].apply(
-        lambda x: eval(x)[0] if pd.notnull(x) and len(eval(x)) > 0 else "Uncategorized"
-    )
+    # plot (only on a render cache miss)
+    def plot():
+        plt = render_cache.pyplot()
+        fig, ax = plt.subplots()
+        ax.pie(spending, labels=spending.index, autopct="%1.1f%%", startangle=90)
+        ax.axis("equal")
+        return fig
 
-    # group by category and sum
-    spending = last_30.groupby("category")["amount"].sum()
+    show_chart("spending_per_cat_pie", plot, start=start, end=end)
 
-    if spending.empty:
-        st.info("No spending activity in the last 30 days.")
+# drill down from a primary category to its detailed categories (selected date range)
+def spending_per_cat_detail(start=None, end=None):
+    in_range = read_rollup("daily_category", source="credit", start=start, end=end)
+
+    if in_range is None:
+        st.warning("Credit transaction data not available.")
         return
 
-    # plot
-    fig, ax = plt.subplots()
-    ax.pie(spending, labels=spending.index, autopct="%1.1f%%", startangle=90)
-    ax.axis("equal")
-    st.pyplot(fig)
+    primaries = in_range.groupby("category_primary", observed=True)["spend_cents"].sum().sort_values(ascending=False)
+    if primaries.empty:
+        st.info("No spending activity in this date range.")
+        return
+
+    primary = st.selectbox("Drill down into a category", primaries.index)
+    selected = in_range[in_range["category_primary"] == primary]
+
+    # detailed names repeat the primary (FOOD_AND_DRINK_COFFEE), drop the prefix for labels
+    detail_spend = store.to_dollars(selected.groupby("category_detailed", observed=True)["spend_cents"].sum())
+    detail_spend = detail_spend.sort_values()
+    detail_spend.index = detail_spend.index.astype(str).str.removeprefix(f"{primary}_")
+
+    # plot (only on a render cache miss)
+    def plot():
+        plt = render_cache.pyplot()
+        fig, ax = plt.subplots(figsize=(10, max(2, len(detail_spend) * 0.5)))
+        bars = ax.barh(detail_spend.index, detail_spend.values, color="#FF5733")
+        ax.set_xlabel("Amount ($)")
+
+        # labels
+        for bar in bars:
+            width = bar.get_width()
+            ax.text(width + 5, bar.get_y() + bar.get_height()/2, f"${width:,.0f}",
+                    va='center', fontsize=9)
+
+        ax.spines['right'].set_visible(False)
+        ax.spines['top'].set_visible(False)
+        ax.spines['left'].set_visible(False)
+        ax.spines['bottom'].set_visible(False)
+
+        plt.tight_layout()
+        return fig
+
+    show_chart("spending_per_cat_detail", plot, start=start, end=end, primary=primary)
 
 
 # income vs expenses
-def income_expenses():
-    _, df_checking, df_credit = read_data()
+def income_expenses(start=None, end=None):
+    monthly = read_rollup("monthly", start=start, end=end)
 
-    if df_checking is None or df_credit is None:
+    if monthly is None:
         st.warning("Transaction data not available.")
         return
 
-    df_checking["date"] = pd.to_datetime(df_checking["date"])
-    df_credit["date"] = pd.to_datetime(df_credit["date"])
-    
-    # Categorize transactions
-    df_income = df_checking[df_checking["amount"] < 0]
-    df_expenses = df_credit[df_credit["amount"] > 0]
-
-    # Add "year-month" column
-    df_income["month"] = df_income["date"].dt.to_period("M")
-    df_expenses["month"] = df_expenses["date"].dt.to_period("M")
-
-    # Group by month and sum amounts
-    income_by_month = df_income.groupby("month")["amount"].sum().abs()  # abs() to make positive
-    expense_by_month = df_expenses.groupby("month")["amount"].sum()
+    # income = checking inflows, expenses = credit card spend (already summed per month)
+    monthly["month"] = pd.PeriodIndex(monthly["month"], freq="M")
+    df_income = monthly[(monthly["source"] == "checking") & (monthly["income_cents"] > 0)]
+    df_expenses = monthly[(monthly["source"] == "credit") & (monthly["spend_cents"] > 0)]
+    income_by_month = store.to_dollars(df_income.set_index("month")["income_cents"])
+    expense_by_month = store.to_dollars(df_expenses.set_index("month")["spend_cents"])
 
     # Align indexes
     all_months = income_by_month.index.union(expense_by_month.index).sort_values()
     income_by_month = income_by_month.reindex(all_months, fill_value=0)
     expense_by_month = expense_by_month.reindex(all_months, fill_value=0)
 
-    # Plot
-    fig, ax = plt.subplots(figsize=(10, 6))
-    labels = all_months.to_timestamp().strftime("%b %Y")
-    bar1 = ax.bar(labels, income_by_month, label="Income", color = "green")
-    bar2 = ax.bar(labels, expense_by_month, label="Expenses", color = "red", alpha=0.7)
-
-    # Add values on top of each bar
-    for bars in [bar1, bar2]:
-        for bar in bars:
-            height = bar.get_height()
-            ax.text(
-                bar.get_x() + bar.get_width() / 2, 
-                height + 5, 
-                f"${height:,.0f}", 
-                ha="center", 
-                va="bottom",
-                fontsize=8
-            )
-
-    ax.set_ylabel("Amount ($)")
-    ax.spines['right'].set_visible(False)
-    ax.spines['top'].set_visible(False)
-    ax.spines['left'].set_visible(False)
-    ax.spines['bottom'].set_visible(False)
-    ax.legend()
-    plt.xticks()
-    st.pyplot(fig)
+    # plot (only on a render cache miss)
+    def plot():
+        plt = render_cache.pyplot()
+        fig, ax = plt.subplots(figsize=(10, 6))
+        labels = all_months.to_timestamp().strftime("%b %Y")
+        bar1 = ax.bar(labels, income_by_month, label="Income", color = "green")
+        bar2 = ax.bar(labels, expense_by_month, label="Expenses", color = "red", alpha=0.7)
+
+        # Add values on top of each bar
+        for bars in [bar1, bar2]:
+            for bar in bars:
+                height = bar.get_height()
+                ax.text(
+                    bar.get_x() + bar.get_width() / 2, 
+                    height + 5, 
+                    f"${height:,.0f}", 
+                    ha="center", 
+                    va="bottom",
+                    fontsize=8
+                )
+
+        ax.set_ylabel("Amount ($)")
+        ax.spines['right'].set_visible(False)
+        ax.spines['top'].set_visible(False)
+        ax.spines['left'].set_visible(False)
+        ax.spines['bottom'].set_visible(False)
+        ax.legend()
+        plt.xticks()
+        return fig
+
+    show_chart("income_expenses", plot, start=start, end=end)
 
 
 # recurrring transactions
@@ -264,88 +406,201 @@ def supscriptions():
         st.warning("Transaction data not available.")
         return
     
-    # ignore refunds/payments
+    # ignore refunds/payments (detect_recurring only looks at positive charges)
     df_credit_checking = pd.concat([df_credit, df_checking], ignore_index=True)
-    df_credit_checking = df_credit_checking[df_credit_checking["amount"] > 0]  
-    df_credit_checking["date"] = pd.to_datetime(df_credit_checking["date"])
-    df_credit_checking["year_month"] = df_credit_checking["date"].dt.to_period("M")
-
-    # exclude merchants with more than 1 charge in the same month
-    month_counts = df_credit_checking.groupby(["merchant_name", "year_month"]).size().reset_index(name="count")
-    bad_merchants = month_counts[month_counts["count"] > 1]["merchant_name"].unique()
-    df_credit_checking = df_credit_checking[~df_credit_checking["merchant_name"].isin(bad_merchants)]
-
-    # group by merchant name
-    grouped = df_credit_checking.groupby("merchant_name")
-
-    possible_subs = []
-
-    for merchant_name, group in grouped:
-        # check how many transactions
-        if len(group) < 2:
-            continue  
-
-        group = group.sort_values("date")
-        group["day_diff"] = group["date"].diff().dt.days
-        group["amount_diff"] = group["amount"].diff().abs()
-
-        # check for monthly interval and similar price
-        monthly_count = ((group["day_diff"] > 25) & (group["day_diff"] < 35)).sum()
-        consistent_price = (group["amount_diff"] <= 2).sum()
-
-        if monthly_count >= 1 and consistent_price >= 1:
-            possible_subs.append({
-                "merchant_name": merchant_name,
-                "avg_amount": round(group["amount"].mean(), 2),
-                "count": len(group)
-            })
-    
+    df_credit_checking["amount"] = store.to_dollars(df_credit_checking["amount_cents"])
+
+    # weekly / monthly / quarterly / annual charges with a stable amount
+    subs_df = detect_recurring(df_credit_checking)
+
     # display 
-    subs_df = pd.DataFrame(possible_subs)
     st.dataframe(subs_df)
 
-def spending_per_merchant():
-    _, _, df_credit = read_data()
+def spending_per_merchant(start=None, end=None):
+    in_range = read_rollup("daily_merchant", source="credit", start=start, end=end)
 
     # error check
-    if df_credit is None:
+    if in_range is None:
         st.warning("No credit card data found.")
         return
 
-    # datetime and filter last 30 days
-    df_credit["date"] = pd.to_datetime(df_credit["date"])
-    last_30 = df_credit[df_credit["date"] >= datetime.today() - timedelta(days=30)]
-
-    # keep only (+) amounts 
-    last_30 = last_30[last_30["amount"] > 0].copy()
-
     # group by merchant_name and sum
-    merchant_spend = last_30.groupby("merchant_name")["amount"].sum()
+    merchant_spend = store.to_dollars(in_range.groupby("merchant_name", observed=True)["spend_cents"].sum())
     merchant_spend = merchant_spend.sort_values()
 
     # error check
     if merchant_spend.empty:
-        st.info("No credit card transactions in the last 30 days.")
+        st.info("No credit card transactions in this date range.")
         return
 
-    # plot 
-    fig, ax = plt.subplots(figsize=(10, 6))
-    bars = ax.barh(merchant_spend.index, merchant_spend.values, color="#FF5733")
-    ax.set_xlabel("Amount ($)")
+    # plot (only on a render cache miss)
+    def plot():
+        plt = render_cache.pyplot()
+        fig, ax = plt.subplots(figsize=(10, 6))
+        bars = ax.barh(merchant_spend.index, merchant_spend.values, color="#FF5733")
+        ax.set_xlabel("Amount ($)")
 
-    # labels 
-    for bar in bars:
-        width = bar.get_width()
-        ax.text(width + 5, bar.get_y() + bar.get_height()/2, f"${width:,.0f}",
-                va='center', fontsize=9)
+        # labels 
+        for bar in bars:
+            width = bar.get_width()
+            ax.text(width + 5, bar.get_y() + bar.get_height()/2, f"${width:,.0f}",
+                    va='center', fontsize=9)
 
-    ax.spines['right'].set_visible(False)
-    ax.spines['top'].set_visible(False)
-    ax.spines['left'].set_visible(False)
-    ax.spines['bottom'].set_visible(False)
+        ax.spines['right'].set_visible(False)
+        ax.spines['top'].set_visible(False)
+        ax.spines['left'].set_visible(False)
+        ax.spines['bottom'].set_visible(False)
 
-    plt.tight_layout()
-    st.pyplot(fig)
+        plt.tight_layout()
+        return fig
+
+    show_chart("spending_per_merchant", plot, start=start, end=end)
+
+# month-to-date credit card spend and where it ends up at the recent daily rate
+def spending_projection():
+    today = date.today()
+    daily = read_rollup("daily_category", source="credit",
+                        start=today - timedelta(days=trends.TRAILING_DAYS + 31), end=today)
+
+    # error check
+    if daily is None:
+        st.warning("No credit card data found.")
+        return
+
+    projection = trends.project_month_end(daily, today)
+    spent, projected = store.to_dollars(projection["spent_cents"]), store.to_dollars(projection["projected_cents"])
+    last_month = store.to_dollars(projection["last_month_cents"])
+
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Spent So Far", f"${spent:,.2f}")
+    col2.metric("Projected Month End", f"${projected:,.2f}", f"${projected - last_month:,.2f} vs last month",
+                delta_color="inverse")
+    col3.metric("Daily Average", f"${store.to_dollars(projection['daily_rate_cents']):,.2f}",
+                help=f"average daily spend over the last {trends.TRAILING_DAYS} days")
+
+    curve = projection["curve"]
+
+    # plot (only on a render cache miss)
+    def plot():
+        plt = render_cache.pyplot()
+        fig, ax = plt.subplots(figsize=(10, 4))
+        ax.plot(curve["date"], store.to_dollars(curve["actual_cents"]), color="#007BFF", label="Spent")
+        ax.plot(curve["date"], store.to_dollars(curve["projected_cents"]), color="#007BFF", linestyle="--",
+                label="Projected")
+        ax.axhline(last_month, color="#999999", linewidth=1, label="Last month")
+        ax.set_ylabel("Amount ($)")
+        ax.legend()
+
+        ax.spines['right'].set_visible(False)
+        ax.spines['top'].set_visible(False)
+
+        plt.tight_layout()
+        return fig
+
+    show_chart("spending_projection", plot, today=today)
+
+# charges well above the usual amount of their merchant / category (see trends.py)
+def unusual_charges(start=None, end=None):
+    by = st.radio("Compare charges by", ["Merchant", "Category"], horizontal=True, key="unusual_by")
+    column = "merchant_name" if by == "Merchant" else "category_primary"
+
+    # whole history (earlier charges are the baseline), once per store version
+    _, df_checking, df_credit = read_data(columns=["date", "name", "amount_cents", column])
+    frames = [df for df in (df_checking, df_credit) if df is not None]
+
+    def load():
+        if not frames:
+            return None
+        with tracing.span("trends.anomalies", by=column) as s:
+            flagged = trends.detect_anomalies(pd.concat(frames, ignore_index=True), by=column)
+            s.set(rows=sum(len(df) for df in frames))
+        return flagged
+
+    flagged = cached(("anomalies", column), load)
+
+    # error check
+    if flagged is None:
+        st.warning("Transaction data not available.")
+        return
+
+    in_range = flagged
+    if start is not None:
+        in_range = in_range[in_range["date"] >= pd.Timestamp(start)]
+    if end is not None:
+        in_range = in_range[in_range["date"] <= pd.Timestamp(end)]
+    if in_range.empty:
+        st.info("No unusual charges in this date range.")
+        return
+
+    st.dataframe(pd.DataFrame({
+        "Date": in_range["date"].dt.date,
+        by: in_range[column],
+        "Name": in_range["name"],
+        "Amount": store.to_dollars(in_range["amount_cents"]),
+        "Usual": store.to_dollars(in_range["median_cents"]),
+        "Recent Average": store.to_dollars(in_range["ewma_cents"]),
+        "Score": in_range["score"],
+    }), hide_index=True, use_container_width=True,
+        column_config={c: st.column_config.NumberColumn(format="$%.2f") for c in ("Amount", "Usual", "Recent Average")})
+
+# stage timings, shown when tracing is on (TRACING=1)
+def performance_panel():
+    from database import fetch_refresh_timings
+
+    st.subheader("Stage timings (this server, most recent spans)")
+    summary = tracing.summary()
+    if summary.empty:
+        st.info("No spans recorded yet.")
+    else:
+        st.dataframe(summary, hide_index=True, use_container_width=True)
+
+    st.subheader("Recent refreshes")
+    timings = pd.DataFrame(fetch_refresh_timings())
+    if timings.empty:
+        st.info("No refresh timings saved yet.")
+        return
+    # seconds per top-level stage for every refresh, then percentiles over refreshes
+    per_refresh = timings[timings["parent"] == "refresh"] \
+        .pivot_table(index="clicked_at", columns="stage", values="seconds", aggfunc="sum") \
+        .sort_index(ascending=False)
+    st.dataframe(per_refresh, use_container_width=True)
+    st.dataframe(tracing.summary(timings.to_dict("records")), hide_index=True, use_container_width=True)
+
+# search / browse individual transactions (sqlite index, see search.py)
+def transactions_explorer():
+    df_accounts, _, _ = read_data()
+
+    text = st.text_input("Search name or merchant")
+    col1, col2, col3 = st.columns(3)
+    dates = col1.date_input("Dates", value=(), help="leave empty for all dates")
+    accounts = {"All accounts": None}
+    if df_accounts is not None:
+        accounts.update(zip(df_accounts["name"], df_accounts["account_id"]))
+    account = col2.selectbox("Account", list(accounts))
+    category = col3.selectbox("Category", ["All categories"] + search.categories())
+
+    col1, col2, col3 = st.columns(3)
+    sort = col1.selectbox("Sort by", list(search.SORTS))
+    descending = col2.selectbox("Order", ["Descending", "Ascending"]) == "Descending"
+    page = col3.number_input("Page", min_value=1, value=1, step=1)
+
+    start = dates[0] if len(dates) > 0 else None
+    end = dates[1] if len(dates) > 1 else None
+    results, total = search.search(
+        text, start=start, end=end, account_id=accounts[account],
+        category=None if category == "All categories" else category,
+        sort=sort, descending=descending, page=page - 1,
+    )
+
+    if total == 0:
+        st.info("No matching transactions.")
+        return
+    if total > search.COUNT_LIMIT:
+        st.caption(f"more than {search.COUNT_LIMIT:,} transactions, page {page}")
+    else:
+        pages = (total + search.PAGE_SIZE - 1) // search.PAGE_SIZE
+        st.caption(f"{total:,} transactions, page {min(page, pages)} of {pages}")
+    st.dataframe(results, hide_index=True, use_container_width=True)
 
 if __name__ == "__main__":
     read_data()
@@ -1,10 +1,5 @@
 import streamlit as st
-import pandas as pd
-from plaid.api import plaid_api
 from datetime import datetime
-from database import log_refresh_time, pull_last_refresh, save_json_to_supabase, make_json_safe, transfrom_data
-from dash_functions import net_worth, spending_per_cat, spending_per_cat_pie, spending_per_month, supscriptions, income_expenses, credit_checking, spending_per_merchant
-from fetcher import fetch_and_save
 
 st.title("Personal Spending Tracker")
 
@@ -16,70 +11,147 @@ if "authenticated" not in st.session_state:
     else:
         st.stop()
 
-# make sure we have latest data uploaded and saved in data folder
+# heavy imports (pandas, pyarrow, supabase) only once we are past the login screen,
+# plaid and matplotlib are imported further down, when a refresh/chart needs them
+import pandas as pd
+
+# frames handed out by read_data share memory with the cache, copy-on-write keeps
+# one chart's column edits from leaking into the next one
+pd.set_option("mode.copy_on_write", True)
+
+from database import local_last_refresh, transfrom_data
+from dash_functions import net_worth, spending_per_cat, spending_per_cat_pie, spending_per_cat_detail, spending_per_month, supscriptions, income_expenses, credit_checking, spending_per_merchant, transactions_explorer, performance_panel, date_range_picker, range_label, recent_alerts, spending_projection, unusual_charges
+from refresh import start_refresh, start_revalidate, current_refresh, OFFLINE
+import store
+import tracing
+
+# render from the local store right away, newer data in supabase is checked for in the
+# background and swapped in when it's ready. only an empty store (or one written with
+# an older schema) has to wait for it
 if "data_loaded" not in st.session_state:
-    transfrom_data()
+    if (store.data_version() is None or store.outdated()) and not OFFLINE:
+        with tracing.span("page.first_load"):
+            try:
+                transfrom_data()
+                print("Data transformed and saved to data folder")
+            except Exception as e:
+                st.error(f"Could not load data from Supabase: {e}")
+    else:
+        start_revalidate()
     st.session_state["data_loaded"] = True
-    print("Data transformed and saved to data folder")
 
 # function to format currency 
 def format_currency(amount):
     return f"${amount:,.2f}"
 
 # --------- pages ---------
-page = st.sidebar.selectbox("Choose a page", ["Home", "Dashboard", "Subscriptions"])
+page = st.sidebar.selectbox("Choose a page", ["Home", "Dashboard", "Trends", "Subscriptions", "Transactions"])
+
+# date range shared by every chart
+start, end = date_range_picker()
+
+# button to resync data, runs in the background (a second click joins the running refresh)
+if st.button("Resync Data", disabled=OFFLINE, help="offline mode, showing local data" if OFFLINE else None):
+    start_refresh()
+
+# progress of the background refresh / revalidation, rerun the page once new data is published
+@st.fragment(run_every="1s")
+def refresh_status():
+    job = current_refresh()
+    if job is None or st.session_state.get("refresh_seen") == job.id:
+        return
+    if not job.running:
+        st.session_state["refresh_seen"] = job.id
+        if job.kind == "refresh" or job.published or job.error is not None:
+            st.rerun()
+        return
+    if job.kind == "refresh":
+        st.progress(job.progress, text=f"Refreshing: {job.stage}")
+    else:
+        st.caption("Checking for newer data...")
+
+job = current_refresh()
+if job is not None and not job.running:
+    # finished before this session saw it, nothing to wait for
+    st.session_state.setdefault("refresh_seen", job.id)
+    if job.error is not None and job.kind == "refresh":
+        st.error(f"Last refresh failed: {job.error}")
+    elif job.error is not None:
+        st.warning("Supabase could not be reached, showing local data.")
+refresh_status()
+
+# as of the last check against supabase, never waits on the network
+last_refresh = local_last_refresh()
+st.caption(f"Last Refresh Time: {last_refresh}" + (" (offline)" if OFFLINE else ""))
+
+# every page render is one span, charts/data reads inside it are its children
+with tracing.span("page", page=page):
+    # --- page 1 ---
+    if page == "Home":
+        st.title("Home")
+
+        # credit card vs checking balance
+        st.subheader("Credit Card vs Checking Balance")
+        credit_checking()
+
+        # net worth
+        st.subheader("Net Worth")
+        net_worth()
+
+        # alerts from the last syncs
+        st.subheader("Alerts")
+        recent_alerts()
+
+    # --- page 2 ---
 
-# button to resync data (with confirmation)
-if st.button("Resync Data"):
-    log_refresh_time()
-    fetch_and_save() 
-    transfrom_data() # stored locally in data folder
-        
-last_refresh = pull_last_refresh()
-st.caption(f"Last Refresh Time: {last_refresh}")
+    elif page == "Dashboard":
+        st.title("Dashboard")
 
-# --- page 1 ---
-if page == "Home":
-    st.title("Home")
+        # Spending by Category
+        st.subheader(f"Spending by Category ({range_label(start, end)})")
+        spending_per_cat(start, end)
+        spending_per_cat_pie(start, end)
+        spending_per_cat_detail(start, end)
 
-    # credit card vs checking balance
-    st.subheader("Credit Card vs Checking Balance")
-    credit_checking()
-    
-    # net worth
-    st.subheader("Net Worth")
-    net_worth()
+        # Spending by Merchant
+        st.subheader(f"Spending by Merchant ({range_label(start, end)})")
+        spending_per_merchant(start, end)
 
-# --- page 2 ---
+        # Income vs Expenses
+        st.subheader("Monthly Income vs Expenses")
+        income_expenses(start, end)
 
-elif page == "Dashboard":
-    st.title("Dashboard")
+        # spending per month
+        st.subheader("Monthly Spending")
+        spending_per_month(start, end)
 
-    # Spending by Category
-    st.subheader("Spending by Category (last 30 days)")
-    spending_per_cat()
-    spending_per_cat_pie()
 
-    # Spending by Merchant
-    st.subheader("Spending by Merchant (last 30 days)")
-    spending_per_merchant()
-   
-    # Income vs Expenses
-    st.subheader("Monthly Income vs Expenses")
-    income_expenses()
+    # --- page 3 ---
 
-    # spending per month
-    st.subheader("Monthly Spending")
-    spending_per_month()
-  
+    elif page == "Trends":
+        st.title("Trends")
 
-# --- page 3 ---
+        # month-end projection
+        st.subheader("This Month's Spending")
+        spending_projection()
 
-elif page == "Subscriptions":
-    st.title("Subscriptions")
-    supscriptions()
+        # charges far off their merchant's / category's usual amount
+        st.subheader(f"Unusual Charges ({range_label(start, end)})")
+        unusual_charges(start, end)
 
+    # --- page 4 ---
 
+    elif page == "Subscriptions":
+        st.title("Subscriptions")
+        supscriptions()
 
+    # --- page 5 ---
 
+    elif page == "Transactions":
+        st.title("Transactions")
+        transactions_explorer()
 
+# stage timings and percentiles, only when tracing is on
+if tracing.ENABLED and st.sidebar.checkbox("Show performance panel"):
+    st.title("Performance")
+    performance_panel()
@@ -1,40 +1,118 @@
 import os
-from supabase import create_client, Client
 from dotenv import load_dotenv
 import json  
+import sqlite3
+import time
+import hashlib
+import threading
+from itertools import islice
 from pprint import pprint
-from datetime import datetime, date
+from datetime import datetime, date, timedelta
 from decimal import Decimal
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+import store
+import rollups
+import registry
+import search
+import tracing
+import snapshots
 
 load_dotenv()  
 
-url: str = os.getenv("SUPABASE_URL")
-key: str = os.getenv("SUPABASE_KEY")
-supabase: Client = create_client(url, key)
+# supabase client is created on first use, importing this module stays cheap
+_supabase = None
+_supabase_lock = threading.Lock()
 
-def make_json_safe(obj):
+def get_supabase():
+    global _supabase
+    with _supabase_lock:
+        if _supabase is None:
+            from supabase import create_client
+            _supabase = create_client(os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_KEY"))
+        return _supabase
+
+def set_supabase(client):
+    # swap in another client, e.g. fakes.FakeSupabase for offline runs
+    global _supabase
+    _supabase = client
+
+# columns kept in the row tables (plaid field names, see schema.sql)
+TRANSACTION_COLUMNS = ["transaction_id", "account_id", "date", "name", "merchant_name", "amount",
+                       "transaction_type", "personal_finance_category", "pending"]
+ACCOUNT_COLUMNS = ["account_id", "name", "type", "subtype", "balances"]
+
+BATCH_SIZE = 500    # rows per upsert request
+PAGE_SIZE = 1000    # postgrest returns at most 1000 rows per request
+MIRROR_PATH = os.path.join("data", "mirror.sqlite")
+# updated_at is the time the writing transaction started, so a batch from a parallel
+# item sync can commit after a later updated_at was already read. pulls re-read this
+# far behind the newest updated_at seen (upserts into the mirror are idempotent)
+MIRROR_OVERLAP = timedelta(minutes=5)
+# newest refresh_log time seen, so pages can show it without asking supabase
+LAST_REFRESH_PATH = os.path.join("data", "last_refresh.txt")
+
+# downloaded json_data snapshots, stored by content hash
+SNAPSHOT_CACHE_DIR = os.path.join("data", "cache", "snapshots")
+SNAPSHOT_META_COLUMNS = "id,name,timestamp,content_hash,encoding,base_id,depth"
+snapshot_cache_stats = {"hits": 0, "misses": 0}
+
+def json_default(obj):
+    # encoder hook for the only non-json types in plaid payloads, called by the C encoder
+    # only when it meets one, so payloads are converted in the same pass that encodes them
     if isinstance(obj, (date, datetime)):
         return obj.isoformat()
-    elif isinstance(obj, Decimal):
+    if isinstance(obj, Decimal):
         return float(obj)
-    elif isinstance(obj, dict):
-        return {k: make_json_safe(v) for k, v in obj.items()}
-    elif isinstance(obj, list):
-        return [make_json_safe(item) for item in obj]
-    else:
-        return obj
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+def dumps(obj, **kwargs):
+    return json.dumps(obj, default=json_default, **kwargs)
+
+def make_json_safe(obj):
+    return json.loads(dumps(obj))
+
+def content_hash(content):
+    return hashlib.sha256(dumps(content, sort_keys=True).encode()).hexdigest()
 
 def save_json_to_supabase(json_data: dict, name: str):
-    safe_data = make_json_safe(json_data)
+    # snapshots are stored compressed, as a delta against the previous snapshot of the
+    # same item when there is one (see snapshots.py)
+    with tracing.span("encode", table="json_data") as s:
+        encoded = dumps(snapshots.canonical(json_data), sort_keys=True)
+        s.set(bytes=len(encoded))
+    content = json.loads(encoded)
+    digest = hashlib.sha256(encoded.encode()).hexdigest()
+    del encoded
+
+    prefix = snapshots.item_of(str(name)) or str(name).rsplit("_", 1)[0]
+    base_meta = fetch_latest_meta([prefix]).get(prefix)
+    base = None
+    if base_meta is not None:
+        base_content = fetch_snapshot_content(base_meta)
+        if base_content is not None:
+            base = {"id": base_meta["id"], "content": base_content}
+
+    with tracing.span("compress", table="json_data") as s:
+        row = snapshots.encode(content, base, (base_meta or {}).get("depth") or 0)
+        s.set(bytes=len(row["blob"]))
 
     data = {
         "name": str(name),
-        "content": safe_data,
-        "timestamp": datetime.now().isoformat()
+        "content": None,
+        "content_hash": digest,
+        "timestamp": datetime.now().isoformat(),
+        "size_bytes": len(row["blob"]),
+        **row,
     }
+    # the next save diffs against this one, keep it in the local cache
+    _cache_snapshot(digest, content)
 
-    response = supabase.table("json_data").insert(data).execute()
+    with tracing.span("supabase.insert", table="json_data", bytes=len(row["blob"])):
+        response = get_supabase().table("json_data").insert(data).execute()
 
     if not response.data:
         print("❌ Supabase insert failed!")
@@ -45,100 +123,657 @@ def save_json_to_supabase(json_data: dict, name: str):
 
 def log_refresh_time():
     now = datetime.now().isoformat()
-    supabase.table("refresh_log").insert({"clicked_at": now}).execute()
+    get_supabase().table("refresh_log").insert({"clicked_at": now}).execute()
+    _save_last_refresh(now)
+    return now
+
+def save_refresh_timings(clicked_at: str, spans: list):
+    # stage timings of one refresh, keyed by its refresh_log time
+    rows = [{
+        "clicked_at": clicked_at,
+        "stage": span["stage"],
+        "parent": span["parent"],
+        "seconds": round(span["seconds"], 6),
+        "rows": span["rows"],
+        "bytes": span["bytes"],
+        "error": span["error"],
+    } for span in spans]
+    for chunk in chunks(rows):
+        get_supabase().table("refresh_timings").insert(chunk).execute()
+    return len(rows)
+
+def fetch_refresh_timings(limit: int = 20):
+    # stage timings of the last `limit` refreshes
+    refreshes = get_supabase().table("refresh_log").select("clicked_at") \
+        .order("clicked_at", desc=True).limit(limit).execute().data
+    if not refreshes:
+        return []
+    return get_supabase().table("refresh_timings").select("*") \
+        .in_("clicked_at", [r["clicked_at"] for r in refreshes]).execute().data
 
 def pull_last_refresh():
-        response = supabase.table("refresh_log").select("*").order("clicked_at", desc=True).limit(1).execute()
+        response = get_supabase().table("refresh_log").select("*").order("clicked_at", desc=True).limit(1).execute()
         if response.data:
+            _save_last_refresh(response.data[0]["clicked_at"])
             return response.data[0]["clicked_at"]
         return None
 
-def fetch_latest_json(prefix: str):
-    response = supabase.table("json_data") \
-        .select("*") \
-        .ilike("name", f"{prefix}%") \
+def _save_last_refresh(clicked_at: str):
+    def write(tmp):
+        with open(tmp, "w") as f:
+            f.write(clicked_at)
+    store.write_atomic(LAST_REFRESH_PATH, write)
+
+def local_last_refresh():
+    # last refresh time as of the last pull_last_refresh / log_refresh_time (no network)
+    try:
+        with open(LAST_REFRESH_PATH) as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+def row_hash(row: dict):
+    return hashlib.sha1(json.dumps(row, sort_keys=True).encode()).hexdigest()
+
+def to_row(record: dict, columns: list, item: str):
+    # project a plaid dict onto the table columns, tagged with its item. one encoder pass
+    # gives both the row hash (same text row_hash() would hash) and the json-native row
+    row = {c: record.get(c) for c in columns}
+    row["item"] = item
+    encoded = dumps(row, sort_keys=True)
+    row = json.loads(encoded)
+    row["row_hash"] = hashlib.sha1(encoded.encode()).hexdigest()
+    return row
+
+def to_rows(records, columns: list, item: str):
+    # lazy, rows are built as the upload consumes them
+    return (to_row(record, columns, item) for record in records)
+
+def chunks(iterable, size=BATCH_SIZE):
+    it = iter(iterable)
+    while True:
+        # rows are built (encoded) lazily, so this is where encoding time shows up
+        with tracing.span("encode") as s:
+            chunk = list(islice(it, size))
+            s.set(rows=len(chunk))
+        if not chunk:
+            return
+        yield chunk
+
+def upsert_rows(table: str, rows, key: str):
+    # rows can be any iterable, only one batch is held at a time
+    count = 0
+    for chunk in chunks(rows):
+        # request size only when tracing, it costs another encoding pass
+        size = len(dumps(chunk)) if tracing.ENABLED else None
+        with tracing.span("supabase.upsert", table=table, rows=len(chunk), bytes=size):
+            get_supabase().table(table).upsert(chunk, on_conflict=key).execute()
+        count += len(chunk)
+    return count
+
+def fetch_rows(table: str, key: str, columns: str = "*", item: str = None,
+               start=None, end=None, since: str = None):
+    # paged select with optional item / date range / changed-since filters
+    rows = []
+    offset = 0
+    while True:
+        query = get_supabase().table(table).select(columns)
+        if item:
+            query = query.eq("item", item)
+        if start:
+            query = query.gte("date", str(start))
+        if end:
+            query = query.lte("date", str(end))
+        if since:
+            query = query.gt("updated_at", since)
+        with tracing.span("supabase.select", table=table) as s:
+            response = query.order(key).range(offset, offset + PAGE_SIZE - 1).execute()
+            s.set(rows=len(response.data))
+        rows.extend(response.data)
+        if len(response.data) < PAGE_SIZE:
+            return rows
+        offset += PAGE_SIZE
+
+def fetch_transactions(item: str = None, start=None, end=None, columns: str = "*", since: str = None):
+    return fetch_rows("transactions", "transaction_id", columns, item, start, end, since)
+
+def fetch_accounts(item: str = None, columns: str = "*", since: str = None):
+    return fetch_rows("accounts", "account_id", columns, item, since=since)
+
+def upsert_transactions(item: str, transactions):
+    rows = ({**row, "removed": False} for row in to_rows(transactions, TRANSACTION_COLUMNS, item))
+    return upsert_rows("transactions", rows, "transaction_id")
+
+def remove_transactions(transaction_ids: list):
+    # soft delete so incremental readers see the removal
+    transaction_ids = list(transaction_ids)
+    for i in range(0, len(transaction_ids), BATCH_SIZE):
+        batch = transaction_ids[i:i + BATCH_SIZE]
+        with tracing.span("supabase.update", table="transactions", rows=len(batch)):
+            get_supabase().table("transactions").update({"removed": True}) \
+                .in_("transaction_id", batch) \
+                .execute()
+    return len(transaction_ids)
+
+def upsert_accounts(item: str, accounts: list):
+    # accounts are few, but skip the ones whose balances didn't move
+    rows = list(to_rows(accounts, ACCOUNT_COLUMNS, item))
+    existing = {r["account_id"]: r["row_hash"] for r in fetch_accounts(item, "account_id,row_hash")}
+    changed = [r for r in rows if existing.get(r["account_id"]) != r["row_hash"]]
+    return upsert_rows("accounts", changed, "account_id")
+
+def save_full_rows(item: str, transactions, start_date, end_date):
+    # full refetch: compare against stored hashes and only upload the difference
+    existing = {
+        r["transaction_id"]: r
+        for r in fetch_transactions(item, start_date, end_date, "transaction_id,row_hash,removed")
+    }
+    fetched_ids = set()
+
+    def changed_rows():
+        for row in to_rows(transactions, TRANSACTION_COLUMNS, item):
+            fetched_ids.add(row["transaction_id"])
+            stored = existing.get(row["transaction_id"])
+            if stored is None or stored["row_hash"] != row["row_hash"] or stored["removed"]:
+                row["removed"] = False
+                yield row
+
+    changed = upsert_rows("transactions", changed_rows(), "transaction_id")
+
+    # anything in the window plaid no longer returns has been removed
+    gone = [t for t, r in existing.items() if t not in fetched_ids and not r["removed"]]
+    remove_transactions(gone)
+
+    print(f"✅ {item}: {changed} rows upserted, {len(gone)} removed")
+    return changed, len(gone)
+
+def fetch_cursor(item: str):
+    response = get_supabase().table("sync_cursors").select("cursor").eq("item", item).limit(1).execute()
+    if response.data:
+        return response.data[0]["cursor"]
+    return None
+
+def save_cursor(item: str, cursor: str):
+    get_supabase().table("sync_cursors").upsert({"item": item, "cursor": cursor}, on_conflict="item").execute()
+
+def fetch_items():
+    return get_supabase().table("plaid_items").select("*").order("item").execute().data
+
+def upsert_item(row: dict):
+    get_supabase().table("plaid_items").upsert(row, on_conflict="item").execute()
+
+def fetch_alert_rules():
+    return get_supabase().table("alert_rules").select("*").order("id").execute().data
+
+def upsert_alert_rule(row: dict):
+    get_supabase().table("alert_rules").upsert(row, on_conflict="id").execute()
+
+def fetch_alert_state(key: str):
+    # rule engine state of one item (see alerts.py), None before its first sync
+    response = get_supabase().table("alert_state").select("state").eq("key", key).limit(1).execute()
+    if response.data:
+        return response.data[0]["state"]
+    return None
+
+def save_alert_state(key: str, state: dict):
+    with tracing.span("supabase.upsert", table="alert_state"):
+        get_supabase().table("alert_state").upsert({"key": key, "state": state}, on_conflict="key").execute()
+
+def upsert_alerts(rows: list):
+    # keyed, so a replayed sync page doesn't fire the same alert twice
+    return upsert_rows("alerts", rows, "key")
+
+def fetch_alerts(limit: int = 50):
+    response = get_supabase().table("alerts").select("*").order("fired_at", desc=True).limit(limit).execute()
+    return response.data
+
+# local mirror of the row tables, one sqlite row per transaction / account keyed by its
+# plaid id, the row itself kept as json. transactions are indexed by item and month like
+# the store's partitions, so a pull only touches the rows it changes and the transform
+# only reads the item/months it rewrites.
+MIRROR_TABLES = """
+create table if not exists transactions (
+    transaction_id text primary key, item text not null, month text, date text, row text not null);
+create index if not exists transactions_partition on transactions (item, month, date);
+create table if not exists accounts (account_id text primary key, item text not null, row text not null);
+create table if not exists meta (key text primary key, value text);
+"""
+MIRROR_KEYS = {"transactions": "transaction_id", "accounts": "account_id"}
+
+def connect_mirror():
+    os.makedirs(os.path.dirname(MIRROR_PATH) or ".", exist_ok=True)
+    conn = sqlite3.connect(MIRROR_PATH, timeout=30)
+    conn.executescript(MIRROR_TABLES)
+    return conn
+
+def _month(row: dict):
+    return str(row["date"])[:7]
+
+def _mirror_rows(conn, table: str, rows: list):
+    # the pulled rows that differ from the mirror: upserts, removed ids and the item/month
+    # partitions they touch (both months when a transaction's date moved). rows of the
+    # overlap the mirror already has don't count as changes
+    key = MIRROR_KEYS[table]
+    extra = "item, month" if table == "transactions" else "item, null"
+    ids = [row[key] for row in rows]
+    stored = {}
+    for i in range(0, len(ids), BATCH_SIZE):
+        batch = ids[i:i + BATCH_SIZE]
+        for row_id, text, item, month in conn.execute(
+                f"select {key}, row, {extra} from {table} where {key} in ({','.join('?' * len(batch))})", batch):
+            stored[row_id] = (text, (item, month))
+    upserts, removed, partitions = [], [], set()
+    for row in rows:
+        old = stored.get(row[key])
+        if row.get("removed"):
+            if old is None:
+                continue
+            removed.append((row[key],))
+        else:
+            text = json.dumps(row, sort_keys=True)
+            if old is not None and old[0] == text:
+                continue
+            upserts.append((row, text))
+            if table == "transactions":
+                partitions.add((row["item"], _month(row)))
+        if old is not None and table == "transactions":
+            partitions.add(old[1])
+    return upserts, removed, partitions
+
+def pull_latest_rows():
+    # applies the rows changed since the last pull to the mirror, returns the (item, month)
+    # transaction partitions that changed
+    conn = connect_mirror()
+    try:
+        meta = conn.execute("select value from meta where key = 'synced_at'").fetchone()
+        synced_at = meta[0] if meta else None
+        since = (datetime.fromisoformat(synced_at) - MIRROR_OVERLAP).isoformat() if synced_at else None
+        pulled = {"transactions": fetch_transactions(since=since), "accounts": fetch_accounts(since=since)}
+
+        changed = set()
+        # one sqlite transaction, a failed pull leaves the mirror (and synced_at) as it was
+        with tracing.span("mirror.write") as s, conn:
+            for table, rows in pulled.items():
+                key = MIRROR_KEYS[table]
+                upserts, removed, partitions = _mirror_rows(conn, table, rows)
+                if table == "transactions":
+                    conn.executemany("insert or replace into transactions values (?, ?, ?, ?, ?)",
+                                     ((r[key], r["item"], _month(r), str(r["date"]), text) for r, text in upserts))
+                else:
+                    conn.executemany("insert or replace into accounts values (?, ?, ?)",
+                                     ((r[key], r["item"], text) for r, text in upserts))
+                conn.executemany(f"delete from {table} where {key} = ?", removed)
+                changed |= partitions
+                synced_at = max([synced_at or ""] + [row["updated_at"] for row in rows]) or None
+                s.set(**{table: len(upserts) + len(removed)})
+                print(f"Pulled {len(upserts) + len(removed)} changed {table} rows")
+            if synced_at:
+                conn.execute("insert or replace into meta values ('synced_at', ?)", (synced_at,))
+    finally:
+        conn.close()
+    return changed
+
+def mirror_has_rows():
+    conn = connect_mirror()
+    try:
+        return conn.execute("select exists (select 1 from transactions)").fetchone()[0] == 1
+    finally:
+        conn.close()
+
+def mirror_payloads(months: dict, accounts_of=()):
+    # the plaid-shaped payloads transfrom_data expects. months: item -> the months to read
+    # (None = all of them), accounts_of: the items whose accounts are read. transactions
+    # come newest first, like plaid sends them
+    payloads = {name: {"transactions": [], "accounts_full": []} for name in set(months) | set(accounts_of)}
+    conn = connect_mirror()
+    try:
+        for item, item_months in sorted(months.items()):
+            query, params = "select row from transactions where item = ?", [item]
+            if item_months is not None:
+                item_months = sorted(item_months)
+                query += f" and month in ({','.join('?' * len(item_months))})"
+                params += item_months
+            rows = conn.execute(query + " order by date desc", params)
+            payloads[item]["transactions"] = [json.loads(text) for text, in rows]
+        accounts_of = sorted(accounts_of)
+        if accounts_of:
+            rows = conn.execute(f"select item, row from accounts where item in ({','.join('?' * len(accounts_of))})",
+                                accounts_of)
+            for item, text in rows:
+                payloads[item]["accounts_full"].append(json.loads(text))
+    finally:
+        conn.close()
+    return payloads
+
+def fetch_latest_meta(prefixes: list):
+    # newest snapshot of every item (no content) in one query: the exact name pattern of
+    # each item, so "credit" never picks up "credit_2" rows, newest per item picked here.
+    # compaction keeps a bounded number of rows per item, so the metadata stays small.
+    # item names are plain identifiers, none of the characters or_ reserves (, . ( ))
+    if not prefixes:
+        return {}
+    filters = ",".join(f"name.ilike.{snapshots.name_pattern(prefix)}" for prefix in prefixes)
+    response = get_supabase().table("json_data") \
+        .select(SNAPSHOT_META_COLUMNS) \
+        .or_(filters) \
         .order("timestamp", desc=True) \
-        .limit(1) \
         .execute()
+    latest = {}
+    for row in response.data:
+        prefix = snapshots.item_of(row["name"])
+        if prefix in prefixes and prefix not in latest:
+            latest[prefix] = row
+    return latest
 
-    if response.data:
-        return response.data[0]["content"]
-    else:
-        print(f"No data found for prefix '{prefix}'")
+def _cached_snapshot_path(digest: str):
+    return os.path.join(SNAPSHOT_CACHE_DIR, f"{digest}.json")
+
+def _load_snapshot_index():
+    # snapshot id -> content hash, for rows saved before content_hash existed
+    path = os.path.join(SNAPSHOT_CACHE_DIR, "index.json")
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+def _save_snapshot_index(index: dict):
+    store.write_atomic(os.path.join(SNAPSHOT_CACHE_DIR, "index.json"),
+                       lambda tmp: _dump_json(index, tmp))
+
+def _dump_json(obj, path):
+    with open(path, "w") as f:
+        json.dump(obj, f)
+
+def _cache_snapshot(digest: str, content: dict):
+    if not os.path.exists(_cached_snapshot_path(digest)):
+        store.write_atomic(_cached_snapshot_path(digest), lambda tmp: _dump_json(content, tmp))
+
+def _fetch_snapshot_meta(snapshot_id):
+    response = get_supabase().table("json_data").select(SNAPSHOT_META_COLUMNS) \
+        .eq("id", snapshot_id).limit(1).execute()
+    return response.data[0] if response.data else None
+
+def fetch_snapshot_content(meta: dict):
+    # content of one snapshot, from the local content-addressed cache when possible.
+    # a delta is rebuilt from its base (recursively, at most KEYFRAME_EVERY rows)
+    index = _load_snapshot_index()
+    digest = meta.get("content_hash") or index.get(str(meta["id"]))
+    if digest and os.path.exists(_cached_snapshot_path(digest)):
+        snapshot_cache_stats["hits"] += 1
+        with open(_cached_snapshot_path(digest)) as f:
+            return json.load(f)
+
+    snapshot_cache_stats["misses"] += 1
+    response = get_supabase().table("json_data").select("content,encoding,blob,base_id") \
+        .eq("id", meta["id"]).limit(1).execute()
+    if not response.data:
         return None
+    row = response.data[0]
+
+    base_content = None
+    if row.get("encoding") == snapshots.DELTA:
+        base_meta = _fetch_snapshot_meta(row["base_id"])
+        base_content = fetch_snapshot_content(base_meta) if base_meta else None
+        if base_content is None:
+            print(f"Snapshot {meta['id']}: base {row['base_id']} is missing")
+            return None
+    content = snapshots.decode(row, base_content)
+
+    digest = meta.get("content_hash") or content_hash(content)
+    _cache_snapshot(digest, content)
+    if not meta.get("content_hash"):
+        index[str(meta["id"])] = digest
+        _save_snapshot_index(index)
+    return content
+
+def compact_snapshots(prefixes: list = None, today=None):
+    # apply the retention policy (snapshots.retained) and rewrite what is left: old plain
+    # json rows get compressed, deltas whose base is dropped are re-encoded against the
+    # previous kept snapshot. rows are rewritten before anything is deleted
+    prefixes = prefixes or [item["item"] for item in registry.load_items()]
+    stats = {"kept": 0, "rewritten": 0, "deleted": 0}
+    for prefix in prefixes:
+        # exactly this item's rows ("credit" must not pick up "credit_2_*", see snapshots.py)
+        metas = get_supabase().table("json_data").select(SNAPSHOT_META_COLUMNS) \
+            .ilike("name", snapshots.name_pattern(prefix)).order("timestamp").execute().data
+        metas = [m for m in metas if snapshots.item_of(m["name"]) == prefix]
+        keep = snapshots.retained(metas, today)
+
+        prev, prev_depth = None, 0
+        for meta in [m for m in metas if m["id"] in keep]:
+            if meta.get("encoding") == snapshots.FULL:
+                depth, valid = 0, True
+            else:
+                # a delta stays valid while its base is the previous kept row and the chain is short
+                depth = prev_depth + 1
+                valid = (meta.get("encoding") == snapshots.DELTA and prev is not None
+                         and meta["base_id"] == prev["id"] and depth < snapshots.KEYFRAME_EVERY)
+                if valid and meta.get("depth") != depth:
+                    get_supabase().table("json_data").update({"depth": depth}).eq("id", meta["id"]).execute()
+            if not valid:
+                content = fetch_snapshot_content(meta)
+                base = {"id": prev["id"], "content": fetch_snapshot_content(prev)} if prev else None
+                row = snapshots.encode(content, base, prev_depth)
+                get_supabase().table("json_data") \
+                    .update({"content": None, "size_bytes": len(row["blob"]), **row}) \
+                    .eq("id", meta["id"]).execute()
+                depth = row["depth"]
+                stats["rewritten"] += 1
+            prev, prev_depth = meta, depth
+
+        gone = [m["id"] for m in metas if m["id"] not in keep]
+        for i in range(0, len(gone), BATCH_SIZE):
+            get_supabase().table("json_data").delete().in_("id", gone[i:i + BATCH_SIZE]).execute()
+        stats["kept"] += len(keep)
+        stats["deleted"] += len(gone)
+
+    print(f"Snapshots: {stats['kept']} kept, {stats['rewritten']} rewritten, {stats['deleted']} deleted")
+    return stats
+
+def fetch_latest_jsons(prefixes: list):
+    latest = fetch_latest_meta(prefixes)
+    contents = {}
+    for prefix in prefixes:
+        if prefix in latest:
+            contents[prefix] = fetch_snapshot_content(latest[prefix])
+        else:
+            print(f"No data found for prefix '{prefix}'")
+            contents[prefix] = None
+    return contents
+
+def fetch_latest_json(prefix: str):
+    return fetch_latest_jsons([prefix])[prefix]
+
+# the transform running in this process (an Event set when it ends) and when it started
+# (time.monotonic()), see transfrom_data
+_transform = {"running": None, "started_at": None}
+_transform_lock = threading.Lock()
+
+def transfrom_data(after: float = None):
+    # single flight: sessions, the refresh job and revalidation share this process, a
+    # caller arriving while a transform runs waits for that one instead of starting
+    # another. a caller that wrote rows at `after` (time.monotonic()) only counts on a
+    # transform that started later, one that began before its writes may have pulled
+    # without them, so it waits for that one to end and then runs its own
+    while True:
+        with _transform_lock:
+            running = _transform["running"]
+            if running is None:
+                _transform["running"] = done = threading.Event()
+                _transform["started_at"] = time.monotonic()
+                break
+            sees_writes = after is None or _transform["started_at"] >= after
+        running.wait()
+        if sees_writes:
+            return
+    try:
+        _transfrom_data()
+    finally:
+        with _transform_lock:
+            _transform["running"] = None
+        done.set()
+
+def _transfrom_data():
+    with tracing.span("transform"):
+        items = registry.load_items()
+        types = registry.item_types(items)
+
+        with tracing.span("mirror.pull") as s:
+            changed = pull_latest_rows()
+            s.set(partitions=len(changed))
+        from_mirror = mirror_has_rows()
+        if from_mirror:
+            changed_items = {item for item, _ in changed}
+        else:
+            # row tables still empty (older deployment), fall back to the json snapshots
+            latest = fetch_latest_jsons(list(types))
+            payloads = {name: payload or {} for name, payload in latest.items()}
+            # an item without a snapshot keeps what the store has instead of being emptied
+            changed_items = {name for name, payload in latest.items() if payload is not None}
+
+        # only items with changed rows (or not in the store yet) get their partitions rewritten
+        new_items = set(types) - set(store.stored_items())
+        to_write = (changed_items | new_items) & set(types)
+        months = None
+        if from_mirror:
+            # items the store has only get the months that changed, new ones all of theirs.
+            # the accounts (few rows) are written whole
+            months = {item: None if item in new_items else {m for i, m in changed if i == item} for item in to_write}
+            with tracing.span("mirror.read", items=len(to_write)):
+                payloads = mirror_payloads(months, accounts_of=types)
+
+        with tracing.span("transform.normalize") as s:
+            df_accounts = normalize_accounts(payloads)
+            df_transactions = normalize_transactions(payloads, types, to_write)
+            s.set(rows=len(df_transactions))
+
+        # published as one new version once everything is written
+        with store.batch():
+            with tracing.span("store.write_accounts", rows=len(df_accounts)):
+                store.write_accounts(df_accounts)
+            print(f"Accounts saved to {store.accounts_path()}")
+            with tracing.span("store.write_transactions", rows=len(df_transactions)) as s:
+                changed_months = store.write_transactions(df_transactions, items=to_write, months=months)
+                s.set(months=len(changed_months))
+            with tracing.span("rollups.update", months=len(changed_months)):
+                rollups.update(changed_months)
+            with tracing.span("search.update", months=len(changed_months)):
+                search.update(changed_months)
+        if store.PRUNE_CSV:
+            store.prune_csv_snapshots()
+        print(f"Transactions for {', '.join(sorted(to_write)) or 'no items'} saved to {store.transactions_dir()}")
+
+# plaid fields read by the normalizers, anything else in a payload is skipped by arrow
+# without being looked at. the defaults apply to records the field is missing from,
+# values that are present but null stay null, like before
+RAW_ACCOUNT_SCHEMA = pa.schema([
+    ("account_id", pa.string()),
+    ("name", pa.string()),
+    ("subtype", pa.string()),
+    ("balances", pa.struct([("current", pa.float64())])),
+])
+RAW_TRANSACTION_SCHEMA = pa.schema([
+    ("account_id", pa.string()),
+    ("date", pa.string()),
+    ("name", pa.string()),
+    ("amount", pa.float64()),
+    ("personal_finance_category", pa.struct([("primary", pa.string()), ("detailed", pa.string())])),
+    ("transaction_type", pa.string()),
+    ("merchant_name", pa.string()),
+])
+
+
+def _struct_table(records: list, schema: pa.Schema):
+    # one struct array over the records is much quicker than Table.from_pylist
+    return pa.Table.from_struct_array(pa.array(records, type=pa.struct(list(schema))))
+
+def _raw_table(records: list, schema: pa.Schema):
+    # plaid records -> arrow columns in one pass. dates are iso strings in the mirror and
+    # snapshots, but date objects when a payload comes straight from the plaid client.
+    # the first record picks the fast path, a payload mixing both has its date objects
+    # turned into strings record by record
+    if records and not isinstance(records[0].get("date", ""), str):
+        try:
+            return _struct_table(records, schema.set(schema.get_field_index("date"), pa.field("date", pa.date32())))
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            pass
+    try:
+        return _struct_table(records, schema)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        records = [r if isinstance(r.get("date"), (str, type(None))) else {**r, "date": r["date"].isoformat()}
+                   for r in records]
+        return _struct_table(records, schema)
+
+def _default(column, value, records: list, key: str):
+    # value for the records without the key, like the old loops' record.get(key, value).
+    # a key that is there but null stays null, so only the null rows are looked at
+    if column.null_count == 0:
+        return column
+    column = column.combine_chunks()
+    absent = [i for i in pc.indices_nonzero(column.is_null()).to_pylist() if key not in records[i]]
+    if not absent:
+        return column
+    mask = np.zeros(len(column), dtype=bool)
+    mask[absent] = True
+    return pc.if_else(pa.array(mask), pa.scalar(value, column.type), column)
+
+def _blank_to_null(column):
+    # "" categories are stored as missing
+    return pc.if_else(pc.equal(column, ""), pa.scalar(None, column.type), column)
+
+def _cents(column):
+    # dollar floats -> int64 cents, like store.to_cents (a missing amount counts as 0)
+    return pc.cast(pc.round(pc.multiply(column.fill_null(0.0), 100)), pa.int64())
+
+def normalize_accounts(payloads: dict):
+    tables = []
+    for name, payload in payloads.items():
+        records = payload.get("accounts_full", [])
+        raw = _raw_table(records, RAW_ACCOUNT_SCHEMA)
+        balances = raw.column("balances").combine_chunks()
+        tables.append(pa.table({
+            "account_id": _default(raw.column("account_id"), f"acc_{name}", records, "account_id"),
+            "item": pa.array([name] * raw.num_rows, pa.string()),
+            "name": _default(raw.column("name"), "Unnamed Account", records, "name"),
+            "subtype": raw.column("subtype"),
+            # no balances at all (or no current balance) counts as a zero balance
+            "balance_cents": _cents(pc.struct_field(balances, "current")),
+        }))
+    if not tables:
+        return pd.DataFrame()
+    return pa.concat_tables(tables).to_pandas()
 
-def transfrom_data():
-    latest_saving_checking = fetch_latest_json("saving_checking")
-    latest_credit = fetch_latest_json("credit")
-
-    # --- accounts ---
-
-    savings_balance = 0
-    checking_balance = 0
-    credit_balance = 0
-    accounts = []
-
-    for acct in (latest_saving_checking.get("accounts_full", []) + latest_credit.get("accounts_full", [])):
-        subtype = acct.get("subtype")
-        balance = acct.get("balances", {}).get("current", 0)
-        if subtype == "savings":
-            savings_balance += balance
-        elif subtype == "checking":
-            checking_balance += balance
-        elif subtype == "credit":
-            credit_balance += balance
-        accounts.append({
-            "account_id": acct.get("account_id", "acc_saving_checking"),
-            "name": acct.get("name", "Unnamed Account"),
-            "subtype": subtype,
-            "balance": balance,
-        })
-
-    filename_accounts = f"data/accounts_{date.today().strftime('%Y%m%d')}.csv"
-    pd.DataFrame(accounts).to_csv(filename_accounts, index=False)
-    print(f"Accounts saved to {filename_accounts}")
-
-    checking_txns = []
-    for txn in latest_saving_checking.get("transactions", []):
-        pf_cat = txn.get("personal_finance_category", {})
-        cat_list = [pf_cat.get("primary", ""), pf_cat.get("detailed", "")]
-        cat_str = str([c for c in cat_list if c])
-        
-        checking_txns.append({
-            "account_id": txn.get("account_id", "acc_credit"),
-            "date": txn.get("date"),
-            "name": txn.get("name"),
-            "amount": txn.get("amount", 0),
-            "category": cat_str,
-            "transaction_type": txn.get("transaction_type", "unknown"),
-            "merchant_name": txn.get("merchant_name", ""),
-        })
-
-    filename_checking_transactions = f"data/checking_transactions_{date.today().strftime('%Y%m%d')}.csv"
-    pd.DataFrame(checking_txns).to_csv(filename_checking_transactions, index=False)
-    print(f"Checking transactions saved to {filename_checking_transactions}")
-
-    # --- credit ---
-
-    credit_txns = []
-    for txn in latest_credit.get("transactions", []):
-        pf_cat = txn.get("personal_finance_category", {})
-        cat_list = [pf_cat.get("primary", ""), pf_cat.get("detailed", "")]
-        cat_str = str([c for c in cat_list if c])
-        
-        credit_txns.append({
-            "account_id": txn.get("account_id", "acc_credit"),
-            "date": txn.get("date"),
-            "name": txn.get("name"),
-            "amount": txn.get("amount", 0),
-            "category": cat_str,
-            "transaction_type": txn.get("transaction_type", "unknown"),
-            "merchant_name": txn.get("merchant_name", ""),
-        })
-
-    filename_credit_transactions = f"data/credit_transactions_{date.today().strftime('%Y%m%d')}.csv"
-    pd.DataFrame(credit_txns).to_csv(filename_credit_transactions, index=False)
-    print(f"Credit transactions saved to {filename_credit_transactions}")
+def normalize_transactions(payloads: dict, types: dict, items):
+    # plaid transactions of the given items -> one frame in the store's layout. each item
+    # is read straight into typed arrow columns and tagged with its item and source
+    tables = []
+    for name in sorted(items):
+        records = payloads[name].get("transactions", [])
+        raw = _raw_table(records, RAW_TRANSACTION_SCHEMA)
+        category = raw.column("personal_finance_category").combine_chunks()
+        n = raw.num_rows
+        tables.append(pa.table({
+            "account_id": _default(raw.column("account_id"), f"acc_{name}", records, "account_id"),
+            "date": raw.column("date").cast(pa.date32()),
+            "name": raw.column("name"),
+            "amount_cents": _cents(raw.column("amount")),
+            "category_primary": _blank_to_null(pc.struct_field(category, "primary")),
+            "category_detailed": _blank_to_null(pc.struct_field(category, "detailed")),
+            "transaction_type": _default(raw.column("transaction_type"), "unknown", records, "transaction_type"),
+            "merchant_name": _default(raw.column("merchant_name"), "", records, "merchant_name"),
+            "source": pa.array([types[name]] * n, pa.string()),
+            "item": pa.array([name] * n, pa.string()),
+        }))
+    columns = store.TRANSACTION_SCHEMA.names + ["item"]
+    if not tables:
+        return pd.DataFrame(columns=columns)
+    table = pa.concat_tables(tables)
+    # low-cardinality columns encoded once over all items, they reach pandas as categoricals
+    for field in store.TRANSACTION_SCHEMA:
+        if pa.types.is_dictionary(field.type):
+            table = table.set_column(table.schema.get_field_index(field.name), field.name,
+                                     table.column(field.name).dictionary_encode())
+    return table.to_pandas(date_as_object=False)[columns]
 
 if __name__ == "__main__":
     # test usage
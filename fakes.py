@@ -0,0 +1,415 @@
+import re
+import json
+from datetime import date, datetime, timedelta, timezone
+
+
+# local stand-ins for the external services so the pipeline can run offline
+# (and fast enough to benchmark with up to a million transactions)
+
+
+def _copy(obj):
+    # like deepcopy for the plain dict/list payloads plaid models hold, a lot faster
+    if isinstance(obj, dict):
+        return {k: _copy(v) for k, v in obj.items()}
+    if isinstance(obj, list):
+        return [_copy(v) for v in obj]
+    return obj
+
+def _roundtrip(rows):
+    # what goes through the supabase http api: json in, json out
+    return json.loads(json.dumps(rows, default=str))
+
+
+class FakeModel:
+    # mimics the plaid model objects: attribute access + to_dict()
+    def __init__(self, data):
+        self._data = data
+
+    def __getattr__(self, key):
+        try:
+            return self._data[key]
+        except KeyError:
+            raise AttributeError(key)
+
+    def to_dict(self):
+        return _copy(self._data)
+
+
+class FakePlaidClient:
+    # in-memory plaid item; every change is appended to a log and the sync
+    # cursor is just a position in that log
+    def __init__(self, transactions=None, accounts=None, item=None):
+        self.transactions = {}
+        self.accounts = accounts or []
+        self.item = item or {"item_id": "fake_item", "institution_id": "ins_fake"}
+        self.changes = []
+        self.calls = {"transactions_get": 0, "transactions_sync": 0, "accounts_get": 0}
+        self._window = None
+        for txn in transactions or []:
+            self.add_transaction(txn)
+
+    # --- mutations ---
+
+    def add_transaction(self, txn):
+        self.transactions[txn["transaction_id"]] = txn
+        self.changes.append(("added", txn))
+
+    def modify_transaction(self, transaction_id, **fields):
+        txn = {**self.transactions[transaction_id], **fields}
+        self.transactions[transaction_id] = txn
+        self.changes.append(("modified", txn))
+
+    def remove_transaction(self, transaction_id):
+        del self.transactions[transaction_id]
+        self.changes.append(("removed", {"transaction_id": transaction_id}))
+
+    # --- plaid api ---
+
+    def transactions_get(self, request):
+        self.calls["transactions_get"] += 1
+        # the sorted window is reused by every page until the data changes
+        key = (len(self.changes), request.start_date, request.end_date)
+        if self._window is None or self._window[0] != key:
+            txns = [t for t in self.transactions.values() if request.start_date <= _as_date(t["date"]) <= request.end_date]
+            txns.sort(key=lambda t: (str(t["date"]), t["transaction_id"]), reverse=True)
+            self._window = (key, txns)
+        txns = self._window[1]
+        offset = request.options.offset
+        count = request.options.count
+        return FakeModel({
+            "total_transactions": len(txns),
+            "transactions": [FakeModel(t) for t in txns[offset:offset + count]],
+            "accounts": [FakeModel(a) for a in self.accounts],
+        })
+
+    def transactions_sync(self, request):
+        self.calls["transactions_sync"] += 1
+        start = int(request.get("cursor") or 0)
+        count = request.get("count") or 100
+        page = self.changes[start:start + count]
+        end = start + len(page)
+        return FakeModel({
+            "added": [FakeModel(t) for kind, t in page if kind == "added"],
+            "modified": [FakeModel(t) for kind, t in page if kind == "modified"],
+            "removed": [FakeModel(t) for kind, t in page if kind == "removed"],
+            "next_cursor": str(end),
+            "has_more": end < len(self.changes),
+            "accounts": [FakeModel(a) for a in self.accounts],
+        })
+
+    def accounts_get(self, request):
+        self.calls["accounts_get"] += 1
+        return FakeModel({
+            "accounts": [FakeModel(a) for a in self.accounts],
+            "item": FakeModel(self.item),
+        })
+
+
+class FakeResponse:
+    def __init__(self, data):
+        self.data = data
+
+
+class FakeQuery:
+    # tiny subset of the postgrest query builder used by database.py
+    def __init__(self, db, table):
+        self.db = db
+        self.table = table
+        self.action = "select"
+        self.payload = None
+        self.on_conflict = None
+        self.columns = None
+        self.filters = []
+        self.order_by = []
+        self.start = 0
+        self.stop = None
+
+    # --- actions ---
+
+    def select(self, columns="*"):
+        self.action = "select"
+        self.columns = None if columns.strip() == "*" else [c.strip() for c in columns.split(",")]
+        return self
+
+    def insert(self, rows):
+        self.action = "insert"
+        self.payload = rows if isinstance(rows, list) else [rows]
+        return self
+
+    def upsert(self, rows, on_conflict="id"):
+        self.action = "upsert"
+        self.payload = rows if isinstance(rows, list) else [rows]
+        self.on_conflict = on_conflict
+        return self
+
+    def update(self, values):
+        self.action = "update"
+        self.payload = values
+        return self
+
+    def delete(self):
+        self.action = "delete"
+        return self
+
+    # --- filters ---
+    # kept as (op, column, value) so identical selects can share a cached result
+
+    def eq(self, column, value):
+        self.filters.append(("eq", column, value))
+        return self
+
+    def neq(self, column, value):
+        self.filters.append(("neq", column, value))
+        return self
+
+    def gt(self, column, value):
+        self.filters.append(("gt", column, value))
+        return self
+
+    def gte(self, column, value):
+        self.filters.append(("gte", column, value))
+        return self
+
+    def lt(self, column, value):
+        self.filters.append(("lt", column, value))
+        return self
+
+    def lte(self, column, value):
+        self.filters.append(("lte", column, value))
+        return self
+
+    def in_(self, column, values):
+        self.filters.append(("in", column, frozenset(values)))
+        return self
+
+    def ilike(self, column, pattern):
+        self.filters.append(("ilike", column, _like(pattern)))
+        return self
+
+    def or_(self, filters):
+        # "col.op.value,col.op.value" with op ilike
+        conditions = []
+        for part in filters.split(","):
+            column, op, value = part.split(".", 2)
+            if op == "ilike":
+                conditions.append(("ilike", column, _like(value)))
+            else:
+                raise ValueError(f"unsupported or_ operator: {op}")
+        self.filters.append(("or", None, tuple(conditions)))
+        return self
+
+    def order(self, column, desc=False):
+        self.order_by.append((column, desc))
+        return self
+
+    def limit(self, n):
+        self.stop = self.start + n
+        return self
+
+    def range(self, start, end):
+        self.start, self.stop = start, end + 1
+        return self
+
+    # --- run ---
+
+    def execute(self):
+        self.db.requests += 1
+        rows = self.db.tables.setdefault(self.table, [])
+
+        if self.action == "insert":
+            payload = _roundtrip(self.payload)
+            for row in payload:
+                rows.append({"id": self.db.next_id(), "updated_at": self.db.now(), **row})
+            self.db.touch(self.table, reindex=True)
+            return FakeResponse(payload)
+
+        if self.action == "upsert":
+            keys = tuple(k.strip() for k in self.on_conflict.split(","))
+            index = self.db.index(self.table, keys)
+            payload = _roundtrip(self.payload)
+            for row in payload:
+                key = tuple(row.get(k) for k in keys)
+                existing = index.get(key)
+                if existing is not None:
+                    existing.update(row)
+                    existing["updated_at"] = self.db.now()
+                else:
+                    new = {"id": self.db.next_id(), **row, "updated_at": self.db.now()}
+                    rows.append(new)
+                    index[key] = new
+            self.db.touch(self.table)
+            return FakeResponse(payload)
+
+        if self.action in ("update", "delete"):
+            matched = [r for r in rows if self._matches(r)]
+            if self.action == "update":
+                values = _roundtrip(self.payload)
+                for row in matched:
+                    row.update(values)
+                    row["updated_at"] = self.db.now()
+                self.db.touch(self.table, reindex=True)
+            else:
+                gone = {id(r) for r in matched}
+                self.db.tables[self.table] = [r for r in rows if id(r) not in gone]
+                self.db.touch(self.table, reindex=True)
+            return FakeResponse(_roundtrip(matched))
+
+        # selects with the same filters and order (e.g. successive pages) share one scan
+        key = (self.table, self.db.versions.get(self.table, 0), tuple(self.filters), tuple(self.order_by))
+        matched = self.db.select_cache.get(key)
+        if matched is None:
+            matched = [r for r in rows if self._matches(r)]
+            for column, desc in reversed(self.order_by):
+                matched.sort(key=lambda r: (r.get(column) is None, r.get(column)), reverse=desc)
+            self.db.select_cache = {key: matched}
+        matched = matched[self.start:self.stop]
+        if self.columns:
+            matched = [{c: r.get(c) for c in self.columns} for r in matched]
+        return FakeResponse(_roundtrip(matched))
+
+    def _matches(self, row):
+        return all(_check(row, op, column, value) for op, column, value in self.filters)
+
+
+def _like(pattern):
+    # (i)like pattern -> case-insensitive regex: % any run, _ one character, \ escapes
+    parts = re.findall(r"\\.|%|_|[^\\%_]+", pattern)
+    regex = "".join(".*" if p == "%" else "." if p == "_" else re.escape(p[1:] if p.startswith("\\") else p)
+                    for p in parts)
+    return re.compile(regex, re.IGNORECASE | re.DOTALL)
+
+def _check(row, op, column, value):
+    if op == "or":
+        return any(_check(row, *cond) for cond in value)
+    current = row.get(column)
+    if op == "eq":
+        return current == value
+    if op == "neq":
+        return current != value
+    if op == "in":
+        return current in value
+    if op == "ilike":
+        return value.fullmatch(str(current if current is not None else "")) is not None
+    if current is None:
+        return False
+    if op == "gt":
+        return current > value
+    if op == "gte":
+        return current >= value
+    if op == "lt":
+        return current < value
+    if op == "lte":
+        return current <= value
+    raise ValueError(f"unsupported filter: {op}")
+
+
+class FakeSupabase:
+    # in-memory stand-in for the supabase client (table api only)
+    def __init__(self, clock=None):
+        self.tables = {}
+        self.requests = 0
+        self.versions = {}
+        self.select_cache = {}
+        self._indexes = {}
+        self._id = 0
+        # callable returning the current (aware) datetime, wall clock time by default
+        self._clock = clock or (lambda: datetime.now(timezone.utc))
+        self._last = None
+
+    def table(self, name):
+        return FakeQuery(self, name)
+
+    def touch(self, table, reindex=False):
+        # called after every write, drops cached selects (and upsert indexes) of the table
+        self.versions[table] = self.versions.get(table, 0) + 1
+        self.select_cache = {}
+        if reindex:
+            self._indexes = {k: v for k, v in self._indexes.items() if k[0] != table}
+
+    def index(self, table, keys):
+        # conflict-key -> row lookup used by upsert, kept between requests
+        if (table, keys) not in self._indexes:
+            self._indexes[(table, keys)] = {tuple(r.get(k) for k in keys): r for r in self.tables.get(table, [])}
+        return self._indexes[(table, keys)]
+
+    def next_id(self):
+        self._id += 1
+        return self._id
+
+    def now(self):
+        # updated_at of a write: the clock, nudged forward a microsecond when it hasn't
+        # moved since the last write, so "changed since" queries stay deterministic
+        now = self._clock()
+        if self._last is not None and now <= self._last:
+            now = self._last + timedelta(microseconds=1)
+        self._last = now
+        return now.isoformat()
+
+
+def step_clock(start: datetime, step: timedelta):
+    # clock for FakeSupabase that moves `step` further on every call
+    ticks = {"now": start - step}
+    def clock():
+        ticks["now"] += step
+        return ticks["now"]
+    return clock
+
+
+def _as_date(value):
+    return value if isinstance(value, date) else date.fromisoformat(value)
+
+
+def fake_transaction(transaction_id, day, amount, merchant="Test Merchant", account_id="acc_fake"):
+    return {
+        "transaction_id": transaction_id,
+        "account_id": account_id,
+        "date": day,
+        "name": merchant.upper(),
+        "merchant_name": merchant,
+        "amount": amount,
+        "transaction_type": "place",
+        "personal_finance_category": {"primary": "GENERAL_MERCHANDISE", "detailed": "GENERAL_MERCHANDISE_OTHER"},
+    }
+
+
+if __name__ == "__main__":
+    # test usage: incremental sync against the fake plaid client and fake supabase
+    import os
+    import tempfile
+    import alerts
+    import database
+    import registry
+    import store
+    from fetcher import sync_item
+
+    os.environ.setdefault("PLAID_ACCESS_TOKEN", "access-fake")
+    # a minute per write, so the second pull only re-reads the last few minutes of rows
+    db = FakeSupabase(clock=step_clock(datetime(2025, 1, 1, tzinfo=timezone.utc), timedelta(minutes=1)))
+    database.set_supabase(db)
+    # everything the demo writes goes to a scratch data dir, never into data/
+    scratch = tempfile.TemporaryDirectory()
+    store.DATA_DIR = scratch.name
+    store.STORE_DIR = os.path.join(scratch.name, "store")
+    database.MIRROR_PATH = os.path.join(scratch.name, "mirror.sqlite")
+    database.LAST_REFRESH_PATH = os.path.join(scratch.name, "last_refresh.txt")
+    database.SNAPSHOT_CACHE_DIR = os.path.join(scratch.name, "cache", "snapshots")
+    alerts.ALERTS_PATH = os.path.join(scratch.name, "alerts.json")
+    alerts.RULES_PATH = os.path.join(scratch.name, "alert_rules.json")
+
+    item = registry.DEFAULT_ITEMS[0]
+    plaid = FakePlaidClient([fake_transaction(f"t{i}", date(2025, 1, i + 1), 10 + i) for i in range(20)])
+    sync_item(item, plaid)
+    database.pull_latest_rows()
+    mirrored = database.mirror_payloads({item["item"]: None})[item["item"]]["transactions"]
+    print(f"initial sync: {len(mirrored)} transactions")
+
+    plaid.add_transaction(fake_transaction("t_new", date(2025, 2, 1), 99))
+    plaid.modify_transaction("t3", amount=42)
+    plaid.remove_transaction("t5")
+    requests_before = db.requests
+    sync_item(item, plaid)
+    changed_items = {name for name, _ in database.pull_latest_rows()}
+    mirrored = database.mirror_payloads({item["item"]: None})[item["item"]]["transactions"]
+    print(f"after sync: {len(mirrored)} transactions, {plaid.calls['transactions_sync']} sync calls, "
+          f"{db.requests - requests_before} supabase requests, changed items: {sorted(changed_items)}")
+    scratch.cleanup()
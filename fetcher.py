@@ -1,69 +1,157 @@
 import os
 import json
+import time
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from datetime import date, timedelta
 from dotenv import load_dotenv
 
-from plaid.api import plaid_api
-from plaid import Configuration, ApiClient
-from plaid.model.transactions_get_request import TransactionsGetRequest
-from plaid.model.accounts_get_request import AccountsGetRequest
-from plaid.model.transactions_get_request_options import TransactionsGetRequestOptions
+import alerts
+import registry
+import snapshots
+import tracing
 
-from database import save_json_to_supabase
+from database import (
+    save_json_to_supabase, upsert_transactions, remove_transactions, upsert_accounts,
+    save_full_rows, fetch_cursor, save_cursor, compact_snapshots,
+)
 
 # Load credentials from .env
 load_dotenv()
 
-# Setup Plaid client
-configuration = Configuration(
-    host=f"https://{os.getenv('PLAID_ENV')}.plaid.com",
-    api_key={
-        "clientId": os.getenv("PLAID_CLIENT_ID"),
-        "secret": os.getenv("PLAID_SECRET"),
-    }
-)
-api_client = ApiClient(configuration)
-client = plaid_api.PlaidApi(api_client)
+# Plaid client, built on first use (plaid is only imported when we actually sync)
+_client = None
+_client_lock = threading.Lock()
+
+def get_plaid_client():
+    global _client
+    with _client_lock:
+        if _client is None:
+            from plaid.api import plaid_api
+            from plaid import Configuration, ApiClient
+            configuration = Configuration(
+                host=f"https://{os.getenv('PLAID_ENV')}.plaid.com",
+                api_key={
+                    "clientId": os.getenv("PLAID_CLIENT_ID"),
+                    "secret": os.getenv("PLAID_SECRET"),
+                }
+            )
+            _client = plaid_api.PlaidApi(ApiClient(configuration))
+        return _client
+
+def date_window(days=365):
+    # date range for full fetches (1 year back), computed per call
+    end_date = date.today()
+    return end_date - timedelta(days=days), end_date
+
+# max plaid requests in flight at once (shared by every item and page)
+MAX_CONCURRENCY = int(os.getenv("PLAID_MAX_CONCURRENCY", 4))
+MAX_RETRIES = 5
+_plaid_slots = threading.BoundedSemaphore(MAX_CONCURRENCY)
+
+# items synced more recently than this are skipped by scheduled runs (a manual resync forces them)
+MIN_SYNC_INTERVAL = timedelta(minutes=float(os.getenv("PLAID_MIN_SYNC_MINUTES", 10)))
+# seconds between two syncs of items at the same institution
+INSTITUTION_SPACING = float(os.getenv("PLAID_INSTITUTION_SPACING", 2))
+
+
+class InstitutionLimiter:
+    # one item per institution at a time, with a minimum gap between them, so adding
+    # several items at one bank doesn't burst its rate limit
+    def __init__(self, spacing=INSTITUTION_SPACING):
+        self.spacing = spacing
+        self._locks = {}
+        self._last = {}
+        self._lock = threading.Lock()
 
-# Set date range (1 year back)
-end_date = date.today()
-start_date = end_date - timedelta(days=365)
+    def slot(self, institution):
+        with self._lock:
+            return self._locks.setdefault(institution, threading.Lock())
 
-def fetch_all_data(access_token=None):
+    def wait(self, institution):
+        # call while holding slot(institution)
+        last = self._last.get(institution)
+        if last is not None:
+            delay = last + self.spacing - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+
+    def done(self, institution):
+        self._last[institution] = time.monotonic()
+
+
+def call_with_retry(fn, request, retries=MAX_RETRIES, backoff=1.0):
+    # run a plaid call inside the shared concurrency limit, backing off on rate limits
+    from plaid import ApiException
+
+    for attempt in range(retries + 1):
+        try:
+            with _plaid_slots:
+                return fn(request)
+        except ApiException as e:
+            if attempt == retries or not is_rate_limited(e):
+                raise
+        delay = backoff * 2 ** attempt + random.uniform(0, backoff)
+        print(f"Rate limited by Plaid, retrying in {delay:.1f}s")
+        time.sleep(delay)
+
+def is_rate_limited(e):
+    return e.status == 429 or "RATE_LIMIT_EXCEEDED" in str(e.body)
+
+def fetch_all_data(access_token=None, plaid_client=None):
     if access_token is None:
         print("No access token provided")
         pass
-    access_token = os.getenv(access_token)
+    from plaid.model.transactions_get_request import TransactionsGetRequest
+    from plaid.model.transactions_get_request_options import TransactionsGetRequestOptions
+    from plaid.model.accounts_get_request import AccountsGetRequest
 
-    # Get total transactions count to paginate
-    all_transactions = []
+    plaid_client = plaid_client or get_plaid_client()
+    access_token = os.getenv(access_token)
+    start_date, end_date = date_window()
     count = 500
-    offset = 0
-
-    # Initial fetch
-    request = TransactionsGetRequest(
-        access_token=access_token,
-        start_date=start_date,
-        end_date=end_date,
-        options=TransactionsGetRequestOptions(count=count, offset=offset)
-    )
-    response = client.transactions_get(request)
-    total_transactions = response.total_transactions
-    all_transactions.extend(response.transactions)
-
-    # Paginate if needed
-    while len(all_transactions) < total_transactions:
-        offset += count
-        request.options.offset = offset
-        paged_response = client.transactions_get(request)
-        all_transactions.extend(paged_response.transactions)
+
+    def fetch_page(offset):
+        request = TransactionsGetRequest(
+            access_token=access_token,
+            start_date=start_date,
+            end_date=end_date,
+            options=TransactionsGetRequestOptions(count=count, offset=offset)
+        )
+        with tracing.span("plaid.transactions_get", offset=offset) as s:
+            response = call_with_retry(plaid_client.transactions_get, request)
+            s.set(rows=len(response.transactions))
+        return response
+
+    # a transaction can shift pages if data changes mid-fetch, keep first occurrence.
+    # pages are converted to dicts as they arrive so the plaid models are freed right away
+    transactions_json = []
+    seen = set()
+    def collect(page):
+        with tracing.span("plaid.to_dict", rows=len(page.transactions)):
+            for t in page.transactions:
+                if t.transaction_id not in seen:
+                    seen.add(t.transaction_id)
+                    transactions_json.append(t.to_dict())
+
+    # Initial fetch tells us how many pages there are
+    response = fetch_page(0)
+    offsets = range(count, response.total_transactions, count)
+    collect(response)
+    del response
+
+    # Fetch remaining pages in parallel (map keeps them in offset order)
+    with ThreadPoolExecutor(max_workers=MAX_CONCURRENCY) as pool:
+        for page in pool.map(fetch_page, offsets):
+            collect(page)
 
     # Get account info (real-time balances, metadata)
     account_request = AccountsGetRequest(access_token=access_token)
-    account_response = client.accounts_get(account_request)
+    with tracing.span("plaid.accounts_get"):
+        account_response = call_with_retry(plaid_client.accounts_get, account_request)
 
-    # Convert all objects to serializable dicts
-    transactions_json = [t.to_dict() for t in all_transactions]
     accounts_json = [a.to_dict() for a in account_response.accounts]
 
     return {
@@ -72,19 +160,134 @@ def fetch_all_data(access_token=None):
         "item": account_response.item.to_dict()
     }
 
-def fetch_and_save():
-    # fetch data from plaid
-    data_credit= fetch_all_data("PLAID_ACCESS_TOKEN_CREDIT")
-    data_saving_checking = fetch_all_data("PLAID_ACCESS_TOKEN")
+def sync_transactions(access_token=None, cursor=None, plaid_client=None):
+    # pull only what changed since cursor (None = full history on first sync).
+    # yields one page at a time ({"added", "modified", "removed", "cursor"}), the last
+    # page's cursor is the new one. if plaid asks for a restart the pages are yielded
+    # again from the original cursor, so consumers must be idempotent (upserts are)
+    from plaid import ApiException
+    from plaid.model.transactions_sync_request import TransactionsSyncRequest
+
+    plaid_client = plaid_client or get_plaid_client()
+    access_token = os.getenv(access_token)
+
+    while True:
+        next_cursor = cursor
+        has_more = True
+        try:
+            while has_more:
+                request = TransactionsSyncRequest(access_token=access_token, count=500)
+                if next_cursor:
+                    request.cursor = next_cursor
+                # the span closes before the yield, the consumer's work isn't counted here
+                with tracing.span("plaid.transactions_sync") as s:
+                    response = call_with_retry(plaid_client.transactions_sync, request)
+                    next_cursor = response.next_cursor
+                    has_more = response.has_more
+                    page = {
+                        "added": [t.to_dict() for t in response.added],
+                        "modified": [t.to_dict() for t in response.modified],
+                        "removed": [r.transaction_id for r in response.removed],
+                        "cursor": next_cursor,
+                    }
+                    s.set(rows=len(page["added"]) + len(page["modified"]) + len(page["removed"]))
+                yield page
+        except ApiException as e:
+            # data changed while paging, plaid wants us to restart from the original cursor
+            if "TRANSACTIONS_SYNC_MUTATION_DURING_PAGINATION" in str(e.body):
+                continue
+            raise
+        return
+
+def sync_item(item, plaid_client=None, rules=None):
+    # incremental refresh of one item: push the plaid delta straight into the row tables
+    from plaid.model.accounts_get_request import AccountsGetRequest
+
+    plaid_client = plaid_client or get_plaid_client()
+    name, access_token = item["item"], item["token_env"]
+    item_alerts = alerts.for_item(name, rules if rules is not None else alerts.load_rules())
+
+    with tracing.span("sync_item", item=name) as s:
+        # each page is stored as soon as it arrives, memory stays at one page however big the delta
+        delta = {"added": 0, "modified": 0, "removed": 0, "cursor": None}
+        for page in sync_transactions(access_token, fetch_cursor(name), plaid_client):
+            upsert_transactions(name, page["added"] + page["modified"])
+            remove_transactions(page["removed"])
+            # alert rules only ever see this page, see alerts.py
+            with tracing.span("alerts.page", rows=len(page["added"]) + len(page["modified"])):
+                item_alerts.page(page["added"], page["modified"], page["removed"])
+            for kind in ("added", "modified", "removed"):
+                delta[kind] += len(page[kind])
+            delta["cursor"] = page["cursor"]
+
+        # balances are cheap and always current
+        account_request = AccountsGetRequest(access_token=os.getenv(access_token))
+        with tracing.span("plaid.accounts_get"):
+            account_response = call_with_retry(plaid_client.accounts_get, account_request)
+        upsert_accounts(name, [a.to_dict() for a in account_response.accounts])
+        delta["institution"] = account_response.item.institution_id
+        delta["changes"] = delta["added"] + delta["modified"] + delta["removed"]
+
+        # only move the cursor once the delta (and the alert state that counted it) is stored
+        delta["alerts"] = len(item_alerts.save())
+        save_cursor(name, delta["cursor"])
+        s.set(rows=delta["changes"])
+
+    print(f"{name}: {delta['added']} added, {delta['modified']} modified, {delta['removed']} removed")
+    return delta
+
+def full_refresh_item(item, plaid_client=None):
+    # full 365-day refetch: upload only rows that differ and keep a json snapshot as backup
+    name = item["item"]
+    with tracing.span("full_refresh_item", item=name) as s:
+        data = fetch_all_data(item["token_env"], plaid_client)
+        changed, gone = save_full_rows(name, data["transactions"], *date_window())
+        upsert_accounts(name, data["accounts_full"])
+        save_json_to_supabase(data, snapshots.snapshot_name(name))
+        s.set(rows=len(data["transactions"]))
+    data["institution"] = data["item"].get("institution_id")
+    data["changes"] = changed + gone
+    return data
+
+def fetch_and_save(mode="sync", force=False, plaid_client=None):
+    # sync every registered item that is due, returns the names of the items that were synced
+    rules = alerts.load_rules()
+    refresh = partial(sync_item, rules=rules) if mode == "sync" else full_refresh_item
+    items = registry.load_items()
+    due = items if force else registry.due_items(items, MIN_SYNC_INTERVAL)
+    skipped = [item["item"] for item in items if item not in due]
+    if skipped:
+        print(f"Skipping recently synced items: {', '.join(skipped)}")
+    if not due:
+        return []
+
+    limiter = InstitutionLimiter()
+
+    def run(item):
+        # items whose institution isn't known yet get their own slot
+        institution = item.get("institution") or item["item"]
+        with limiter.slot(institution):
+            limiter.wait(institution)
+            try:
+                result = refresh(item, plaid_client)
+            finally:
+                limiter.done(institution)
+        registry.mark_synced(item, result.get("institution"), result["changes"])
+        return item["item"]
+
+    with ThreadPoolExecutor(max_workers=min(len(due), MAX_CONCURRENCY)) as pool:
+        synced = list(pool.map(run, due))
+
+    # balance rules look at every item's accounts, once they are all stored
+    with tracing.span("alerts.balances"):
+        alerts.check_balances(rules)
 
-    # save to database
-    filename_saving_checking = f"saving_checking_{date.today().strftime('%Y%m%d')}"
-    save_json_to_supabase(data_saving_checking, filename_saving_checking)
+    # full refreshes add snapshots, thin out the old ones
+    if mode != "sync":
+        compact_snapshots(synced)
 
-    filename_credit = f"credit_{date.today().strftime('%Y%m%d')}"
-    save_json_to_supabase(data_credit, filename_credit)
-    
-    print(f"Saved data to {filename_saving_checking} and {filename_credit}")
+    print(f"Saved data for {', '.join(synced)} ({mode})")
+    return synced
 
 
 if __name__ == "__main__":
@@ -0,0 +1,98 @@
+import numpy as np
+import pandas as pd
+
+# recurring charge detection over one sorted frame, no per-merchant python loop
+#
+# every charge is compared with the previous charge of the same merchant: the gap in
+# days is bucketed into a period and the amount is checked against a tolerance.
+# a merchant is recurring when most of its gaps fall in the same period bucket and
+# most of its amounts stay within tolerance.
+
+PERIODS = pd.DataFrame({
+    "period": ["weekly", "monthly", "quarterly", "annual"],
+    "min_days": [5, 26, 85, 350],
+    "max_days": [9, 35, 97, 380],
+})
+
+
+def detect_recurring(df, amount_tolerance=2.0, amount_tolerance_pct=0.10, min_share=0.6, min_charges=2):
+    # df needs merchant_name, date and amount; only positive charges are considered
+    df = df[df["merchant_name"].notna() & (df["amount"] > 0)]
+    columns = ["merchant_name", "period", "avg_amount", "last_amount", "count",
+               "last_date", "next_date", "confidence"]
+    if df.empty:
+        return pd.DataFrame(columns=columns)
+
+    merchants = df["merchant_name"].astype("category")
+    names = merchants.cat.categories
+    codes = merchants.cat.codes.to_numpy()
+    dates = df["date"].to_numpy().astype("datetime64[D]")
+    amounts = df["amount"].to_numpy(dtype=float)
+
+    # one sort by (merchant, date), everything after is shifts over neighbouring rows
+    order = np.lexsort((dates, codes))
+    codes, dates, amounts = codes[order], dates[order], amounts[order]
+
+    same = np.r_[False, codes[1:] == codes[:-1]]    # row has a previous charge of the same merchant
+    is_last = np.r_[codes[1:] != codes[:-1], True]  # last charge of each merchant
+    gaps = np.r_[0, np.diff(dates).astype(np.int64)]
+    prev_amounts = np.r_[np.nan, amounts[:-1]]
+    tolerance = np.maximum(amount_tolerance, amount_tolerance_pct * prev_amounts)
+    consistent = same & (np.abs(amounts - prev_amounts) <= tolerance)
+
+    # bucket every gap into a period (-1 = irregular)
+    bucket = np.full(len(codes), -1)
+    for i, (lo, hi) in enumerate(zip(PERIODS["min_days"], PERIODS["max_days"])):
+        bucket[same & (gaps >= lo) & (gaps <= hi)] = i
+
+    # per-merchant totals via bincount
+    n = len(names)
+    n_charges = np.bincount(codes, minlength=n)
+    n_gaps = np.maximum(n_charges - 1, 1)
+    period_counts = np.stack([
+        np.bincount(codes[bucket == i], minlength=n) for i in range(len(PERIODS))
+    ], axis=1)
+    period = period_counts.argmax(axis=1)
+    period_share = period_counts.max(axis=1) / n_gaps
+    amount_share = np.bincount(codes[consistent], minlength=n) / n_gaps
+    avg_amount = np.bincount(codes, weights=amounts, minlength=n) / np.maximum(n_charges, 1)
+
+    last_dates = np.full(n, np.datetime64("NaT"), dtype="datetime64[D]")
+    last_amounts = np.full(n, np.nan)
+    last_dates[codes[is_last]] = dates[is_last]
+    last_amounts[codes[is_last]] = amounts[is_last]
+
+    # typical gap of the dominant period, used to predict the next charge
+    in_period = same & (bucket == period[codes])
+    median_gap = pd.Series(gaps[in_period]).groupby(codes[in_period]).median().reindex(range(n)).to_numpy()
+
+    recurring = (
+        (n_charges >= min_charges)
+        & (period_counts.max(axis=1) > 0)
+        & (period_share >= min_share)
+        & (amount_share >= min_share)
+    )
+    idx = np.flatnonzero(recurring)
+
+    result = pd.DataFrame({
+        "merchant_name": names[idx],
+        "period": PERIODS["period"].to_numpy()[period[idx]],
+        "avg_amount": avg_amount[idx].round(2),
+        "last_amount": last_amounts[idx],
+        "count": n_charges[idx],
+        "last_date": pd.to_datetime(last_dates[idx]),
+        "next_date": pd.to_datetime(last_dates[idx]) + pd.to_timedelta(median_gap[idx], unit="D"),
+        "confidence": np.minimum(period_share[idx], amount_share[idx]).round(2),
+    }, columns=columns)
+    return result.sort_values(["next_date", "merchant_name"]).reset_index(drop=True)
+
+
+if __name__ == "__main__":
+    # test usage
+    rows = []
+    for i in range(12):
+        rows.append({"merchant_name": "Netflix", "date": pd.Timestamp("2025-01-15") + pd.DateOffset(months=i), "amount": 15.49})
+        rows.append({"merchant_name": "Coffee", "date": pd.Timestamp("2025-01-01") + pd.Timedelta(days=i * 3), "amount": 4 + i})
+    for i in range(20):
+        rows.append({"merchant_name": "Gym", "date": pd.Timestamp("2025-01-06") + pd.Timedelta(weeks=i), "amount": 12.0})
+    print(detect_recurring(pd.DataFrame(rows)))
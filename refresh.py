@@ -0,0 +1,155 @@
+import os
+import time
+import itertools
+import threading
+from datetime import datetime
+
+import alerts
+import store
+import tracing
+from database import log_refresh_time, pull_last_refresh, save_refresh_timings, transfrom_data
+
+# "Resync Data" runs here in a background thread instead of inside the streamlit
+# script run. only one refresh runs per process: asking for another while one is in
+# flight hands back the running job instead of starting a second one.
+#
+# new sessions render straight from the local store and start a revalidation job: the
+# same background thread, but only checking supabase for rows newer than the local
+# mirror (no plaid). sessions rerun once it has published a new store version. with
+# OFFLINE=1 nothing talks to supabase or plaid, pages work from the local data only.
+
+OFFLINE = os.getenv("OFFLINE", "0").lower() in ("1", "true", "yes")
+# a revalidation is skipped if the last one finished less than this long ago
+REVALIDATE_EVERY = int(os.getenv("REVALIDATE_SECONDS", 60))
+
+_lock = threading.Lock()
+_job = None
+_last_revalidated = None
+_ids = itertools.count(1)
+
+# spans saved with a refresh (chart / page spans of sessions running meanwhile are left out)
+REFRESH_STAGES = ("refresh", "fetch_and_save", "sync_item", "full_refresh_item", "plaid.", "supabase.",
+                  "encode", "transform", "mirror.", "store.", "rollups.", "search.", "alerts.")
+
+
+class RefreshJob:
+    def __init__(self, kind="refresh"):
+        self.id = next(_ids)
+        self.kind = kind
+        self.stage = "Queued"
+        self.progress = 0.0
+        self.error = None
+        self.started_at = datetime.now()
+        self.finished_at = None
+        self.version_before = store.data_version()
+        self.done = threading.Event()
+
+    @property
+    def running(self):
+        return not self.done.is_set()
+
+    @property
+    def published(self):
+        # finished with a new store version, open pages should rerun to pick it up
+        return not self.running and store.data_version() != self.version_before
+
+    def set_stage(self, stage, progress):
+        self.stage = stage
+        self.progress = progress
+        print(f"Refresh #{self.id}: {stage}")
+
+
+def start_refresh():
+    # single flight: join the in-flight refresh if there is one. a running revalidation
+    # doesn't fetch from plaid, the refresh is queued behind it instead
+    global _job
+    with _lock:
+        if _job is not None and _job.running and _job.kind == "refresh":
+            return _job
+        after = _job if _job is not None and _job.running else None
+        _job = RefreshJob()
+        threading.Thread(target=_run, args=(_job, after), name=f"refresh-{_job.id}", daemon=True).start()
+        return _job
+
+def start_revalidate():
+    # check supabase for newer data in the background (joins a running refresh).
+    # returns None when offline or recently checked
+    global _job, _last_revalidated
+    if OFFLINE:
+        return None
+    with _lock:
+        if _job is not None and _job.running:
+            return _job
+        if _last_revalidated is not None and time.monotonic() - _last_revalidated < REVALIDATE_EVERY:
+            return None
+        _last_revalidated = time.monotonic()
+        _job = RefreshJob(kind="revalidate")
+        threading.Thread(target=_revalidate, args=(_job,), name=f"revalidate-{_job.id}", daemon=True).start()
+        return _job
+
+def current_refresh():
+    return _job
+
+def _revalidate(job):
+    try:
+        with tracing.span("revalidate"):
+            job.set_stage("Checking for newer data", 0.1)
+            pull_last_refresh()
+            alerts.pull()
+            job.set_stage("Updating local data", 0.5)
+            transfrom_data()
+        job.set_stage("Done", 1.0)
+    except Exception as e:
+        # supabase unreachable or failing: pages keep serving the local data
+        job.error = e
+        job.stage = "Failed"
+        print(f"Revalidation #{job.id} failed, serving local data: {e}")
+    finally:
+        job.finished_at = datetime.now()
+        job.done.set()
+
+def _run(job, after=None):
+    # plaid is only imported once a refresh actually runs
+    from fetcher import fetch_and_save
+
+    # its transform must not be the one a revalidation already started (that one
+    # wouldn't see the rows this refresh writes), so wait for it to end first
+    if after is not None:
+        job.set_stage("Waiting for the data check to finish", 0.0)
+        after.done.wait()
+
+    started = time.time()
+    clicked_at = None
+    try:
+        with tracing.span("refresh"):
+            job.set_stage("Logging refresh", 0.05)
+            clicked_at = log_refresh_time()
+            job.set_stage("Fetching from Plaid", 0.1)
+            # asked for by the user: every item, however recently it was synced (the
+            # minimum interval is for scheduled runs, the per-institution limit still applies)
+            with tracing.span("fetch_and_save"):
+                fetch_and_save(force=True)
+            # the store publishes the new version in one step at the end of this stage.
+            # a transform that started before the rows above were written (a session's
+            # first load, say) is waited for and then run again
+            job.set_stage("Updating local data", 0.7)
+            transfrom_data(after=time.monotonic())
+        job.set_stage("Done", 1.0)
+    except Exception as e:
+        job.error = e
+        job.stage = "Failed"
+        print(f"Refresh #{job.id} failed: {e}")
+    finally:
+        job.finished_at = datetime.now()
+        job.done.set()
+
+    if tracing.ENABLED and clicked_at is not None:
+        try:
+            save_refresh_timings(clicked_at, tracing.recent(since=started, prefixes=REFRESH_STAGES))
+        except Exception as e:
+            print(f"Could not save refresh timings: {e}")
+
+
+if __name__ == "__main__":
+    # test usage
+    start_refresh().done.wait()
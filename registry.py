@@ -0,0 +1,71 @@
+from datetime import datetime, timezone
+
+import database
+
+# plaid items we track, one row per item in the plaid_items table (see schema.sql)
+#
+#   item            name used for rows, sync cursors and store partitions ("credit")
+#   token_env       env var holding the access token, the token itself stays in .env
+#   type            "checking" (bank accounts) or "credit", decides how transactions are charted
+#   institution     plaid institution_id, filled in on the first sync, used for rate limiting
+#   last_synced_at  when the item was last synced successfully
+#
+# the two original items are seeded into the table the first time it is read or written,
+# so registering a new item adds to them instead of replacing them.
+
+DEFAULT_ITEMS = [
+    {"item": "saving_checking", "token_env": "PLAID_ACCESS_TOKEN", "type": "checking"},
+    {"item": "credit", "token_env": "PLAID_ACCESS_TOKEN_CREDIT", "type": "credit"},
+]
+
+
+def seed_defaults():
+    # writes DEFAULT_ITEMS into an empty table, returns the table's rows
+    items = database.fetch_items()
+    if items:
+        return items
+    for item in DEFAULT_ITEMS:
+        database.upsert_item(dict(item, institution=None, enabled=True))
+    return database.fetch_items()
+
+def load_items():
+    return [item for item in seed_defaults() if item.get("enabled", True)]
+
+def register_item(item: str, token_env: str, type: str, institution: str = None):
+    seed_defaults()
+    database.upsert_item({
+        "item": item,
+        "token_env": token_env,
+        "type": type,
+        "institution": institution,
+        "enabled": True,
+    })
+
+def due_items(items: list, min_interval, now: datetime = None):
+    # items not synced within min_interval
+    now = now or datetime.now(timezone.utc)
+    due = []
+    for item in items:
+        last = item.get("last_synced_at")
+        if last is None or now - datetime.fromisoformat(last) >= min_interval:
+            due.append(item)
+    return due
+
+def mark_synced(item: dict, institution: str = None, changes: int = 0):
+    database.upsert_item({
+        "item": item["item"],
+        "token_env": item["token_env"],
+        "type": item["type"],
+        "institution": institution or item.get("institution"),
+        "last_synced_at": datetime.now(timezone.utc).isoformat(),
+        "last_changes": changes,
+    })
+
+def item_types(items: list):
+    return {item["item"]: item["type"] for item in items}
+
+
+if __name__ == "__main__":
+    # test usage
+    for item in load_items():
+        print(item)
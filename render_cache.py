@@ -0,0 +1,61 @@
+import io
+import threading
+from collections import OrderedDict
+
+import tracing
+
+# finished charts as png bytes, so reruns with unchanged data skip matplotlib entirely.
+# keys are (data version, chart name, parameters); least recently used entries are
+# dropped once MAX_ENTRIES is reached.
+
+MAX_ENTRIES = 64
+DPI = 100
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+# pyplot keeps global state, only one session may draw at a time
+_render_lock = threading.Lock()
+
+stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+
+def pyplot():
+    # matplotlib is only imported once something actually has to be drawn
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    return plt
+
+def render_png(key, plot):
+    # plot() returns a matplotlib figure (or None) and is only called on a miss
+    with _cache_lock:
+        if key in _cache:
+            _cache.move_to_end(key)
+            stats["hits"] += 1
+            return _cache[key]
+        stats["misses"] += 1
+
+    with _render_lock, tracing.span("chart.render") as span:
+        fig = plot()
+        png = None
+        if fig is not None:
+            try:
+                buf = io.BytesIO()
+                fig.savefig(buf, format="png", dpi=DPI)
+                png = buf.getvalue()
+            finally:
+                # figures are never shown through pyplot, close them so they don't pile up
+                pyplot().close(fig)
+        span.set(bytes=len(png) if png else 0)
+
+    with _cache_lock:
+        _cache[key] = png
+        _cache.move_to_end(key)
+        while len(_cache) > MAX_ENTRIES:
+            _cache.popitem(last=False)
+            stats["evictions"] += 1
+    return png
+
+def clear():
+    with _cache_lock:
+        _cache.clear()
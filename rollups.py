@@ -0,0 +1,106 @@
+import os
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+import store
+
+# small pre-aggregated tables the charts read instead of raw transactions
+#
+#   daily_category   date, source, category_primary, category_detailed, spend_cents
+#   daily_merchant   date, source, merchant_name, spend_cents
+#   monthly          month, source, spend_cents, income_cents
+#
+# spend = sum of positive amounts, income = -(sum of negative amounts), both in whole
+# cents like the store. every row belongs to a month, so a refresh only rebuilds the
+# months that changed
+
+ROLLUPS = ["daily_category", "daily_merchant", "monthly"]
+
+
+def rollups_dir():
+    # part of the store's generation, published together with the transactions
+    return os.path.join(store.current_dir(), "rollups")
+
+def rollup_path(name):
+    return os.path.join(rollups_dir(), f"{name}.parquet")
+
+
+def build(df):
+    # aggregate a frame of transactions into every rollup
+    df = df.copy()
+    days = df["date"].to_numpy().astype("datetime64[D]")
+    df["month"] = days.astype("datetime64[M]").astype(str)
+    df["date"] = days.astype("datetime64[ns]")
+    cents = df["amount_cents"]
+    df["spend_cents"] = cents.where(cents > 0, 0)
+    df["income_cents"] = -cents.where(cents < 0, 0)
+    for col in ("category_primary", "category_detailed"):
+        values = df[col].astype("category")
+        if "Uncategorized" not in values.cat.categories:
+            values = values.cat.add_categories("Uncategorized")
+        df[col] = values.fillna("Uncategorized")
+
+    # categorical keys: observed=True keeps only combinations that actually occur
+    spending = df[cents > 0]
+    return {
+        "daily_category": spending.groupby(
+            ["month", "date", "source", "category_primary", "category_detailed"], as_index=False, observed=True
+        )["spend_cents"].sum(),
+        "daily_merchant": spending.groupby(
+            ["month", "date", "source", "merchant_name"], as_index=False, observed=True
+        )["spend_cents"].sum(),
+        "monthly": df.groupby(["month", "source"], as_index=False, observed=True)[
+            ["spend_cents", "income_cents"]].sum(),
+    }
+
+def update(months=None):
+    with store.batch():
+        _update(months)
+
+def _update(months=None):
+    # rebuild the buckets of the given months (None = everything) and keep the rest as is
+    existing = {name: read(name) for name in ROLLUPS}
+    # missing, or from before amounts were kept in cents: rebuild everything
+    if any(df is None or "spend_cents" not in df for df in existing.values()):
+        months = None
+    elif months is not None and not months:
+        return
+
+    if months is None:
+        df = store.read_transactions()
+        keep = {name: None for name in ROLLUPS}
+    else:
+        months = sorted(months)
+        # only the partitions of the changed months are read
+        df = store.read_transactions(months=months)
+        keep = {name: rows[~rows["month"].isin(months)] for name, rows in existing.items()}
+
+    if df is None:
+        return
+    fresh = build(df)
+
+    for name in ROLLUPS:
+        rows = pd.concat([keep[name], fresh[name]], ignore_index=True) if keep[name] is not None else fresh[name]
+        # concat of categoricals with different categories falls back to strings
+        rows = rows.astype({c: "category" for c in rows.columns if rows[c].dtype == object and c != "month"})
+        sort_cols = [c for c in ("month", "date") if c in rows]
+        rows = rows.sort_values(sort_cols, kind="stable").reset_index(drop=True)
+        table = pa.Table.from_pandas(rows, preserve_index=False)
+        store.write_atomic(rollup_path(name), lambda tmp: pq.write_table(table, tmp))
+
+    store.bump_version()
+    print(f"Rollups updated for {'all months' if months is None else ', '.join(months)}")
+
+def read(name):
+    if not os.path.exists(rollup_path(name)):
+        return None
+    return pq.read_table(rollup_path(name)).to_pandas()
+
+
+if __name__ == "__main__":
+    # test usage
+    update()
+    for name in ROLLUPS:
+        print(name, read(name))
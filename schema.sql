@@ -0,0 +1,131 @@
+-- supabase tables used by database.py
+-- (json_data and refresh_log predate this file and are not repeated here)
+
+-- one row per plaid transaction, soft deleted via "removed" so incremental readers see removals
+create table if not exists transactions (
+    transaction_id text primary key,
+    item text not null,
+    account_id text,
+    date date,
+    name text,
+    merchant_name text,
+    amount numeric,
+    transaction_type text,
+    personal_finance_category jsonb,
+    pending boolean,
+    removed boolean not null default false,
+    row_hash text,
+    updated_at timestamptz not null default now()
+);
+create index if not exists transactions_item_date_idx on transactions (item, date);
+create index if not exists transactions_updated_at_idx on transactions (updated_at);
+
+create table if not exists accounts (
+    account_id text primary key,
+    item text not null,
+    name text,
+    type text,
+    subtype text,
+    balances jsonb,
+    row_hash text,
+    updated_at timestamptz not null default now()
+);
+create index if not exists accounts_updated_at_idx on accounts (updated_at);
+
+-- plaid /transactions/sync cursor per item
+create table if not exists sync_cursors (
+    item text primary key,
+    cursor text,
+    updated_at timestamptz not null default now()
+);
+
+-- registry of plaid items, the access token itself stays in .env (token_env names the variable)
+create table if not exists plaid_items (
+    item text primary key,
+    token_env text not null,
+    type text not null default 'checking',  -- 'checking' or 'credit'
+    institution text,
+    enabled boolean not null default true,
+    last_synced_at timestamptz,
+    last_changes integer,
+    updated_at timestamptz not null default now()
+);
+
+-- stage timings of each refresh (TRACING=1), linked to refresh_log by clicked_at
+create table if not exists refresh_timings (
+    id bigint generated always as identity primary key,
+    clicked_at text not null,
+    stage text not null,
+    parent text,
+    seconds double precision,
+    rows integer,
+    bytes bigint,
+    error text
+);
+create index if not exists refresh_timings_clicked_at_idx on refresh_timings (clicked_at);
+
+-- alert rules (see alerts.py), the built-in defaults apply while this is empty
+create table if not exists alert_rules (
+    id text primary key,
+    kind text not null,  -- 'budget', 'large_transaction', 'new_subscription', 'low_balance', 'low_margin'
+    threshold_cents bigint,
+    category text,       -- budget: personal_finance_category primary ...
+    merchant text,       -- ... or merchant name
+    subtype text,        -- low_balance: account subtype
+    enabled boolean not null default true,
+    updated_at timestamptz not null default now()
+);
+
+-- alert engine state: per item (counted transactions, recent charges), "budgets" (totals across
+-- items) and "balances", so a sync only evaluates its own delta
+create table if not exists alert_state (
+    key text primary key,
+    state jsonb not null,
+    updated_at timestamptz not null default now()
+);
+
+-- fired alerts, key identifies the rule and period / transaction they fired for
+create table if not exists alerts (
+    key text primary key,
+    rule_id text not null,
+    kind text not null,
+    item text,
+    message text not null,
+    amount_cents bigint,
+    fired_at timestamptz not null default now()
+);
+create index if not exists alerts_fired_at_idx on alerts (fired_at);
+
+-- server clock for updated_at, so "changed since" reads don't depend on client clocks
+create or replace function touch_updated_at() returns trigger as $$
+begin
+    new.updated_at = now();
+    return new;
+end;
+$$ language plpgsql;
+
+create or replace trigger transactions_touch before insert or update on transactions
+    for each row execute function touch_updated_at();
+create or replace trigger accounts_touch before insert or update on accounts
+    for each row execute function touch_updated_at();
+create or replace trigger sync_cursors_touch before insert or update on sync_cursors
+    for each row execute function touch_updated_at();
+create or replace trigger plaid_items_touch before insert or update on plaid_items
+    for each row execute function touch_updated_at();
+create or replace trigger alert_rules_touch before insert or update on alert_rules
+    for each row execute function touch_updated_at();
+create or replace trigger alert_state_touch before insert or update on alert_state
+    for each row execute function touch_updated_at();
+
+-- json_data snapshots carry a hash of their content so clients can cache them locally
+alter table json_data add column if not exists content_hash text;
+
+-- snapshots are stored compressed or as a delta against base_id (see snapshots.py),
+-- content stays filled only for rows written before that
+alter table json_data alter column content drop not null;
+alter table json_data add column if not exists encoding text;
+alter table json_data add column if not exists blob text;
+alter table json_data add column if not exists base_id bigint;
+alter table json_data add column if not exists depth integer;
+alter table json_data add column if not exists size_bytes integer;
+create index if not exists json_data_name_timestamp_idx on json_data (name, timestamp);
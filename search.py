@@ -0,0 +1,196 @@
+import os
+import re
+import sqlite3
+
+import pandas as pd
+
+import store
+
+# sqlite index over individual transactions for the Transactions page
+#
+#   transactions      one row per stored transaction, b-tree indexes on date, amount,
+#                     account and category
+#   transactions_fts  fts5 index over name / merchant_name, kept in sync by triggers
+#
+# built from the local store during transfrom_data: like the rollups only the months
+# that changed are replaced, a missing index is rebuilt from scratch. queries only
+# ever pull one page of rows.
+
+COLUMNS = ["date", "name", "merchant_name", "amount", "category_primary", "category_detailed",
+           "account_id", "item", "source", "transaction_type"]
+
+SORTS = {"date": "date", "amount": "amount", "merchant": "merchant_name", "category": "category_primary"}
+PAGE_SIZE = 50
+# matches are counted up to this many, broad filters would otherwise touch every row
+COUNT_LIMIT = 10_000
+
+TABLE = """
+create table if not exists transactions (
+    id integer primary key,
+    month text not null,
+    date text not null,
+    name text,
+    merchant_name text,
+    amount real,
+    category_primary text,
+    category_detailed text,
+    account_id text,
+    item text,
+    source text,
+    transaction_type text
+);
+create virtual table if not exists transactions_fts using fts5(
+    name, merchant_name, content='transactions', content_rowid='id',
+    tokenize='unicode61 remove_diacritics 2'
+);
+"""
+
+# created after the bulk load of a full build, maintaining them row by row is far slower
+INDEXES = """
+create index if not exists transactions_month_idx on transactions (month);
+create index if not exists transactions_date_idx on transactions (date);
+create index if not exists transactions_amount_idx on transactions (amount);
+create index if not exists transactions_account_idx on transactions (account_id, date);
+create index if not exists transactions_category_idx on transactions (category_primary, date);
+create trigger if not exists transactions_ai after insert on transactions begin
+    insert into transactions_fts (rowid, name, merchant_name) values (new.id, new.name, new.merchant_name);
+end;
+create trigger if not exists transactions_ad after delete on transactions begin
+    insert into transactions_fts (transactions_fts, rowid, name, merchant_name)
+    values ('delete', old.id, old.name, old.merchant_name);
+end;
+"""
+
+
+def index_path():
+    return os.path.join(store.STORE_DIR, "search.sqlite")
+
+def connect():
+    # short-lived connections, an update holds the write lock only for its own months
+    return sqlite3.connect(index_path(), timeout=30)
+
+
+# --- build ---
+
+def _insert(conn, df):
+    days = df["date"].to_numpy().astype("datetime64[D]")
+    # dollars here, the index is only for display and filtering
+    df = df.assign(month=days.astype("datetime64[M]").astype(str), date=days.astype(str),
+                   amount=store.to_dollars(df["amount_cents"]))
+    columns = ["month"] + COLUMNS
+    # plain python values column by column (NaN -> NULL), then zipped into rows
+    values = [df[c].astype(object).where(df[c].notna(), None).tolist() for c in columns]
+    rows = zip(*values)
+    conn.executemany(
+        f"insert into transactions ({', '.join(columns)}) values ({', '.join('?' * len(columns))})", rows
+    )
+
+def update(months=None):
+    # replace the rows of the given months (None = rebuild everything)
+    if not os.path.exists(index_path()):
+        months = None
+    elif months is not None and not months:
+        return
+
+    if months is None:
+        # build next to the live index and swap it in, readers never see a partial index
+        def build(tmp):
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            conn = sqlite3.connect(tmp)
+            # scratch file until it is renamed, no need for a rollback journal
+            conn.execute("pragma journal_mode=off")
+            conn.execute("pragma synchronous=off")
+            with conn:
+                conn.executescript(TABLE)
+                for df in store.iter_transactions():
+                    _insert(conn, df)
+                conn.execute("insert into transactions_fts (transactions_fts) values ('rebuild')")
+                conn.executescript(INDEXES)
+                # table statistics, so the planner picks the right index per filter
+                conn.execute("analyze")
+            conn.close()
+        store.write_atomic(index_path(), build)
+    else:
+        months = sorted(months)
+        conn = connect()
+        with conn:
+            conn.executemany("delete from transactions where month = ?", [(m,) for m in months])
+            for df in store.iter_transactions(months=months):
+                _insert(conn, df)
+        conn.close()
+    print(f"Search index updated for {'all months' if months is None else ', '.join(months)}")
+
+
+# --- query ---
+
+def _match_expression(text):
+    # every word must match as a prefix: "star cof" -> "star"* "cof"*
+    words = re.findall(r"\w+", text or "")
+    return " ".join(f'"{w}"*' for w in words)
+
+def search(text=None, start=None, end=None, min_amount=None, max_amount=None, account_id=None,
+           category=None, sort="date", descending=True, page=0, page_size=PAGE_SIZE):
+    # one page of matching transactions plus the number of matches (at most COUNT_LIMIT + 1)
+    if not os.path.exists(index_path()):
+        return pd.DataFrame(columns=COLUMNS), 0
+
+    where, params = [], []
+    match = _match_expression(text)
+    if match:
+        where.append("id in (select rowid from transactions_fts where transactions_fts match ?)")
+        params.append(match)
+    if start is not None:
+        where.append("date >= ?")
+        params.append(str(pd.Timestamp(start).date()))
+    if end is not None:
+        where.append("date <= ?")
+        params.append(str(pd.Timestamp(end).date()))
+    if min_amount is not None:
+        where.append("amount >= ?")
+        params.append(min_amount)
+    if max_amount is not None:
+        where.append("amount <= ?")
+        params.append(max_amount)
+    if account_id:
+        where.append("account_id = ?")
+        params.append(account_id)
+    if category:
+        where.append("category_primary = ?")
+        params.append(category)
+    where = f"where {' and '.join(where)}" if where else ""
+    order = f"{SORTS[sort]} {'desc' if descending else 'asc'}, id {'desc' if descending else 'asc'}"
+
+    conn = connect()
+    try:
+        total = conn.execute(
+            f"select count(*) from (select 1 from transactions {where} limit ?)", params + [COUNT_LIMIT + 1]
+        ).fetchone()[0]
+        rows = conn.execute(
+            f"select {', '.join(COLUMNS)} from transactions {where} order by {order} limit ? offset ?",
+            params + [page_size, page * page_size],
+        ).fetchall()
+    finally:
+        conn.close()
+
+    df = pd.DataFrame(rows, columns=COLUMNS)
+    df["date"] = pd.to_datetime(df["date"])
+    return df, total
+
+def categories():
+    if not os.path.exists(index_path()):
+        return []
+    conn = connect()
+    try:
+        rows = conn.execute(
+            "select distinct category_primary from transactions where category_primary is not null order by 1"
+        ).fetchall()
+    finally:
+        conn.close()
+    return [r[0] for r in rows]
+
+
+if __name__ == "__main__":
+    # test usage
+    update()
+    print(search("coffee"))
@@ -0,0 +1,121 @@
+import re
+import json
+import zlib
+import base64
+from datetime import date, datetime, timedelta
+
+# storage format of the json_data snapshots (the supabase side lives in database.py)
+#
+#   encoding   blob                                           base_id / depth
+#   (null)     -, plain json in the content column (old rows)  -
+#   "zlib"     the whole snapshot, zlib compressed + base64    - / 0
+#   "delta"    changes against the snapshot base_id,           base row / base depth + 1
+#              zlib compressed + base64
+#
+# a delta holds the transactions that were added or changed, the ids that are gone
+# and every other top-level key in full (accounts, item, both small). after
+# KEYFRAME_EVERY deltas in a row the next snapshot is stored whole again, so rebuilding
+# one never needs more than that many rows.
+#
+# rows are named "<item>_YYYYMMDD". item names may contain "_" themselves (credit,
+# credit_2), so an item's rows are matched on the whole name, never on a prefix.
+#
+# retention: the newest snapshot of each day for DAILY_DAYS days, the newest of each
+# month before that. database.compact_snapshots applies it.
+
+FULL = "zlib"
+DELTA = "delta"
+KEYFRAME_EVERY = 7
+DAILY_DAYS = 31
+LEVEL = 9
+NAME_DATE = re.compile(r"_(\d{8})$")
+
+
+def snapshot_name(item: str, day: date = None):
+    return f"{item}_{(day or date.today()).strftime('%Y%m%d')}"
+
+def name_pattern(item: str):
+    # (i)like pattern matching exactly the rows of one item: the item name with the
+    # wildcards escaped, "_" and eight single characters
+    escaped = item.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return escaped + "\\_" + "_" * 8
+
+def item_of(name: str):
+    # item a snapshot row belongs to, None for names not in the "<item>_YYYYMMDD" form
+    match = NAME_DATE.search(name or "")
+    return name[:match.start()] if match else None
+
+def canonical(content: dict):
+    # transactions in a fixed order (newest first, then by id), so the same data always
+    # encodes (and hashes) the same however plaid or a delta ordered it
+    if "transactions" not in content:
+        return content
+    transactions = sorted(content["transactions"],
+                          key=lambda t: (str(t.get("date")), str(t.get("transaction_id"))), reverse=True)
+    return {**content, "transactions": transactions}
+
+def pack(obj):
+    text = json.dumps(obj, sort_keys=True, separators=(",", ":"))
+    return base64.b64encode(zlib.compress(text.encode(), LEVEL)).decode("ascii")
+
+def unpack(blob: str):
+    return json.loads(zlib.decompress(base64.b64decode(blob)))
+
+def diff(base: dict, content: dict):
+    # delta taking base to content (both json-native)
+    old = {t["transaction_id"]: t for t in base.get("transactions", [])}
+    new = {t["transaction_id"]: t for t in content.get("transactions", [])}
+    return {
+        "upsert": [t for tid, t in new.items() if old.get(tid) != t],
+        "remove": [tid for tid in old if tid not in new],
+        "rest": {k: v for k, v in content.items() if k != "transactions"},
+    }
+
+def apply(base: dict, delta: dict):
+    transactions = {t["transaction_id"]: t for t in base.get("transactions", [])}
+    for tid in delta["remove"]:
+        transactions.pop(tid, None)
+    for t in delta["upsert"]:
+        transactions[t["transaction_id"]] = t
+    return canonical({**delta["rest"], "transactions": list(transactions.values())})
+
+def encode(content: dict, base=None, base_depth=0):
+    # columns for a json_data row; a delta when there is a base and the chain isn't too long
+    if base is not None and base_depth + 1 < KEYFRAME_EVERY:
+        delta = diff(base["content"], content)
+        return {"encoding": DELTA, "blob": pack(delta), "base_id": base["id"], "depth": base_depth + 1}
+    return {"encoding": FULL, "blob": pack(content), "base_id": None, "depth": 0}
+
+def decode(row: dict, base_content=None):
+    # content of a row, base_content is the rebuilt content of row["base_id"] for deltas
+    if row.get("encoding") == DELTA:
+        return apply(base_content, unpack(row["blob"]))
+    if row.get("encoding") == FULL:
+        return unpack(row["blob"])
+    return row["content"]
+
+def _day(timestamp: str):
+    return datetime.fromisoformat(timestamp).date()
+
+def retained(metas: list, today: date = None, daily_days: int = DAILY_DAYS):
+    # ids to keep out of one prefix's snapshots: newest per day within daily_days, newest
+    # per month before that, and always the newest overall
+    today = today or date.today()
+    newest = {}
+    for meta in metas:
+        day = _day(meta["timestamp"])
+        key = day if today - day <= timedelta(days=daily_days) else (day.year, day.month)
+        if key not in newest or meta["timestamp"] > newest[key]["timestamp"]:
+            newest[key] = meta
+    keep = {meta["id"] for meta in newest.values()}
+    if metas:
+        keep.add(max(metas, key=lambda m: m["timestamp"])["id"])
+    return keep
+
+
+if __name__ == "__main__":
+    # test usage
+    base = {"item": {}, "transactions": [{"transaction_id": "a", "date": "2025-01-01", "amount": 1}]}
+    new = {"item": {}, "transactions": [{"transaction_id": "b", "date": "2025-01-02", "amount": 2}]}
+    row = encode(new, {"id": 1, "content": base})
+    print(row, decode(row, base) == canonical(new))
@@ -0,0 +1,402 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+import tempfile
+import threading
+from contextlib import contextmanager
+from glob import glob
+from datetime import date
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+# local columnar store: transactions partitioned by plaid item and month, accounts in one small file
+#
+#   data/store/gen-<n>/transactions/item=credit/month=2025-01/part-0.parquet
+#   data/store/gen-<n>/accounts.parquet
+#   data/store/gen-<n>/rollups/...        (rollups.py)
+#   data/store/gen-<n>/manifest.json      (content hash per item/month, so unchanged partitions aren't rewritten)
+#   data/store/VERSION                    (name of the published generation, the cache key of readers)
+#
+# every write happens in a batch() that works on a staging generation: a hard-linked
+# copy of the published one where changed files are replaced (never edited in place).
+# the batch publishes it by rewriting VERSION, so readers switch from one complete
+# generation to the next and never see a half-written store. the previous generation
+# is kept until the next publish, for readers still scanning it.
+
+DATA_DIR = "data"
+STORE_DIR = os.path.join(DATA_DIR, "store")
+
+# drop month partitions older than this many months (unset = keep everything)
+RETENTION_MONTHS = int(os.getenv("STORE_RETENTION_MONTHS", 0)) or None
+
+# the dated csv exports from before the store are the only local history older than
+# the row tables, they are only thinned out (newest of each kept) when asked for
+PRUNE_CSV = os.getenv("PRUNE_CSV_SNAPSHOTS", "0").lower() in ("1", "true", "yes")
+
+# amounts are whole cents (int64), so sums are exact; low-cardinality strings are
+# dictionary encoded and come back from the readers as pandas categoricals
+CATEGORY = pa.dictionary(pa.int32(), pa.string())
+
+TRANSACTION_SCHEMA = pa.schema([
+    ("account_id", CATEGORY),
+    ("date", pa.date32()),
+    ("name", pa.string()),
+    ("amount_cents", pa.int64()),
+    ("category_primary", CATEGORY),
+    ("category_detailed", CATEGORY),
+    ("transaction_type", CATEGORY),
+    ("merchant_name", CATEGORY),
+    ("source", CATEGORY),
+])
+# "item" and "month" are not stored in the files, they come from the partition path
+
+ACCOUNT_SCHEMA = pa.schema([
+    ("account_id", pa.string()),
+    ("item", pa.string()),
+    ("name", pa.string()),
+    ("subtype", pa.string()),
+    ("balance_cents", pa.int64()),
+])
+
+PARTITIONING = ds.partitioning(pa.schema([("item", pa.string()), ("month", pa.string())]), flavor="hive")
+
+
+# what a generation holds, everything else in STORE_DIR (search index, VERSION) lives outside
+GENERATION_ENTRIES = ["transactions", "rollups", "accounts.parquet", "manifest.json"]
+
+
+def transactions_dir():
+    return os.path.join(current_dir(), "transactions")
+
+def accounts_path():
+    return os.path.join(current_dir(), "accounts.parquet")
+
+def manifest_path():
+    return os.path.join(current_dir(), "manifest.json")
+
+def version_path():
+    return os.path.join(STORE_DIR, "VERSION")
+
+
+def data_version():
+    # cheap token that changes whenever the store is written (None = empty store)
+    try:
+        with open(version_path()) as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        return None
+
+def live_dir():
+    # root of the published generation (STORE_DIR itself for a store from before generations)
+    version = data_version()
+    if version and version.startswith("gen-") and os.path.isdir(os.path.join(STORE_DIR, version)):
+        return os.path.join(STORE_DIR, version)
+    return STORE_DIR
+
+def current_dir():
+    # the batch's staging generation for the thread running it, the published one for everyone else
+    staging = _batch["staging"]
+    if staging is not None and _batch["owner"] == threading.get_ident():
+        return staging
+    return live_dir()
+
+# one batch at a time; nested batch() calls join the outer one, which publishes a single
+# new version when it ends (nothing, when nothing was written, or when it failed)
+_batch = {"depth": 0, "dirty": False, "staging": None, "owner": None}
+_batch_lock = threading.RLock()
+
+@contextmanager
+def batch():
+    with _batch_lock:
+        if _batch["depth"] == 0:
+            _batch.update(staging=_stage(), owner=threading.get_ident(), dirty=False)
+        _batch["depth"] += 1
+        failed = False
+        try:
+            yield
+        except BaseException:
+            failed = True
+            raise
+        finally:
+            _batch["depth"] -= 1
+            if _batch["depth"] == 0:
+                staging, dirty = _batch["staging"], _batch["dirty"] and not failed
+                _batch.update(staging=None, owner=None, dirty=False)
+                if dirty:
+                    _publish(staging)
+                else:
+                    shutil.rmtree(staging, ignore_errors=True)
+
+def bump_version():
+    # mark the batch as changed (outside a batch: publish a copy of the store right away)
+    with batch():
+        _batch["dirty"] = True
+
+def _stage():
+    # new generation sharing every file of the live one through hard links
+    live = live_dir()
+    staging = os.path.join(STORE_DIR, f"gen-{time.time_ns()}")
+    os.makedirs(staging)
+    for entry in GENERATION_ENTRIES:
+        src, dst = os.path.join(live, entry), os.path.join(staging, entry)
+        if os.path.isdir(src):
+            shutil.copytree(src, dst, copy_function=_link, ignore=shutil.ignore_patterns("*.tmp"))
+        elif os.path.exists(src):
+            _link(src, dst)
+    return staging
+
+def _link(src, dst):
+    try:
+        os.link(src, dst)
+    except OSError:
+        # filesystem without hard links
+        shutil.copy2(src, dst)
+
+def _publish(staging):
+    previous = live_dir()
+    name = os.path.basename(staging)
+    def write(tmp):
+        with open(tmp, "w") as f:
+            f.write(name)
+    write_atomic(version_path(), write)
+
+    # keep the new and the previous generation, drop anything older
+    keep = {name, os.path.basename(previous)}
+    for path in glob(os.path.join(STORE_DIR, "gen-*")):
+        if os.path.basename(path) not in keep:
+            shutil.rmtree(path, ignore_errors=True)
+    if previous != STORE_DIR:
+        # files of a store from before generations
+        for entry in GENERATION_ENTRIES:
+            path = os.path.join(STORE_DIR, entry)
+            if os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+            elif os.path.exists(path):
+                os.remove(path)
+
+
+def _load_manifest():
+    if not os.path.exists(manifest_path()):
+        return {}
+    with open(manifest_path()) as f:
+        return json.load(f)
+
+def stored_items():
+    # an outdated store has nothing usable, every item is written again
+    if outdated():
+        return []
+    return sorted({key.split("/")[0] for key in _load_manifest()})
+
+def outdated():
+    # partitions written with an older TRANSACTION_SCHEMA (float amounts, plain strings)
+    files = glob(os.path.join(transactions_dir(), "item=*", "month=*", "*.parquet"))
+    return bool(files) and not pq.read_schema(files[0]).equals(TRANSACTION_SCHEMA)
+
+def _partition_dir(key):
+    item, month = key.split("/")
+    return os.path.join(transactions_dir(), f"item={item}", f"month={month}")
+
+def _save_manifest(manifest):
+    def write(tmp):
+        with open(tmp, "w") as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+    write_atomic(manifest_path(), write)
+
+def write_atomic(path, write):
+    # write next to the target then rename, readers never see a half-written file. the
+    # scratch name is unique, two writers of the same path each publish a whole file
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix=f"{os.path.basename(path)}.", suffix=".tmp")
+    os.close(fd)
+    os.chmod(tmp, 0o644)  # mkstemp makes it owner-only, keep the usual file mode
+    try:
+        write(tmp)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+def to_cents(amounts):
+    # dollar floats -> int64 cents (rounded, so 0.1 + 0.2 style noise never leaks in)
+    return (pd.Series(amounts, dtype="float64") * 100).round().astype("int64")
+
+def to_dollars(cents):
+    # for display only, sums are taken in cents
+    return cents / 100
+
+def _to_table(df, schema):
+    df = df.copy()
+    for field in schema:
+        if field.name not in df:
+            df[field.name] = None
+        elif isinstance(df[field.name].dtype, pd.CategoricalDtype):
+            # a partition only stores the values it uses, not the whole frame's categories
+            df[field.name] = df[field.name].cat.remove_unused_categories()
+    if "date" in df:
+        df["date"] = pd.to_datetime(df["date"]).dt.date
+    return pa.Table.from_pandas(df[schema.names], schema=schema, preserve_index=False)
+
+def _digest(table):
+    return hashlib.sha1(
+        pd.util.hash_pandas_object(table.to_pandas(), index=False).values.tobytes()
+    ).hexdigest()
+
+
+# --- write ---
+
+def write_transactions(df, items=None, months=None):
+    with batch():
+        return _write_transactions(df, items, months)
+
+def _write_transactions(df, items=None, months=None):
+    # rewrite only the item/month partitions whose contents changed, returns the changed months.
+    # only partitions of the given items (default: the items in df) are touched, and of
+    # those only the months in months[item] when given (df then holds just those months)
+    manifest = _load_manifest()
+    if any("/" not in key for key in manifest) or outdated():
+        # store from before per-item partitioning or the current schema, start over
+        shutil.rmtree(transactions_dir(), ignore_errors=True)
+        manifest = {}
+
+    items = set(df["item"]) if items is None else set(items)
+    keys = df["item"] + "/" + pd.to_datetime(df["date"]).dt.strftime("%Y-%m")
+    cutoff = _retention_cutoff()
+
+    changed = []
+    for key, part in df.groupby(keys, sort=True):
+        month = key.split("/")[1]
+        if cutoff and month < cutoff:
+            continue
+        table = _to_table(part, TRANSACTION_SCHEMA)
+        digest = _digest(table)
+        if manifest.get(key) == digest:
+            continue
+        path = os.path.join(_partition_dir(key), "part-0.parquet")
+        write_atomic(path, lambda tmp: pq.write_table(table, tmp))
+        manifest[key] = digest
+        changed.append(month)
+
+    # partitions of these items that no longer have any transactions
+    def touched(key):
+        item, month = key.split("/")
+        return item in items and (not months or months.get(item) is None or month in months[item])
+    for key in sorted(set(manifest) - set(keys)):
+        if touched(key):
+            shutil.rmtree(_partition_dir(key), ignore_errors=True)
+            del manifest[key]
+            changed.append(key.split("/")[1])
+
+    _save_manifest(manifest)
+    # months aged out of the retention window count as changed, so the rollups and the
+    # search index drop them too
+    changed += [key.split("/")[1] for key in apply_retention()]
+    if changed:
+        bump_version()
+    print(f"Store: {len(changed)} partitions rewritten")
+    return sorted(set(changed))
+
+def write_accounts(df):
+    table = _to_table(df, ACCOUNT_SCHEMA)
+    with batch():
+        # a transform with no account changes shouldn't invalidate every reader's cache
+        if os.path.exists(accounts_path()) and pq.read_table(accounts_path(), schema=ACCOUNT_SCHEMA).equals(table):
+            return
+        write_atomic(accounts_path(), lambda tmp: pq.write_table(table, tmp))
+        bump_version()
+
+
+# --- read ---
+
+def read_transactions(source=None, start=None, end=None, columns=None, months=None, item=None):
+    # partitions outside [start, end] (or not in months / item) are skipped without being opened
+    if not os.path.isdir(transactions_dir()):
+        return None
+    dataset = ds.dataset(transactions_dir(), format="parquet", partitioning=PARTITIONING)
+
+    expr = None
+    def add(cond):
+        nonlocal expr
+        expr = cond if expr is None else expr & cond
+
+    if source:
+        add(ds.field("source") == source)
+    if item:
+        add(ds.field("item") == item)
+    if months is not None:
+        add(ds.field("month").isin(list(months)))
+    if start:
+        start = pd.Timestamp(start).date()
+        add(ds.field("month") >= start.strftime("%Y-%m"))
+        add(ds.field("date") >= start)
+    if end:
+        end = pd.Timestamp(end).date()
+        add(ds.field("month") <= end.strftime("%Y-%m"))
+        add(ds.field("date") <= end)
+
+    table = dataset.to_table(columns=columns, filter=expr)
+    if "month" in table.column_names and (columns is None or "month" not in columns):
+        table = table.drop_columns(["month"])
+    return table.to_pandas(date_as_object=False)
+
+def iter_transactions(months=None, batch_size=50_000):
+    # same data as read_transactions in bounded batches, with the item and month columns
+    if not os.path.isdir(transactions_dir()):
+        return
+    dataset = ds.dataset(transactions_dir(), format="parquet", partitioning=PARTITIONING)
+    expr = ds.field("month").isin(list(months)) if months is not None else None
+    for batch in dataset.to_batches(filter=expr, batch_size=batch_size):
+        yield batch.to_pandas(date_as_object=False)
+
+def read_accounts():
+    if not os.path.exists(accounts_path()):
+        return None
+    return pq.read_table(accounts_path()).to_pandas()
+
+
+# --- housekeeping ---
+
+def _retention_cutoff(months=RETENTION_MONTHS, today=None):
+    if not months:
+        return None
+    today = today or date.today()
+    return (pd.Timestamp(today) - pd.DateOffset(months=months)).strftime("%Y-%m")
+
+def apply_retention(months=RETENTION_MONTHS, today=None):
+    # drop month partitions older than the retention window
+    cutoff = _retention_cutoff(months, today)
+    if not cutoff:
+        return []
+    with batch():
+        manifest = _load_manifest()
+        dropped = [key for key in manifest if key.split("/")[-1] < cutoff]
+        for key in dropped:
+            shutil.rmtree(_partition_dir(key), ignore_errors=True)
+            del manifest[key]
+        if dropped:
+            _save_manifest(manifest)
+            bump_version()
+    return dropped
+
+def prune_csv_snapshots():
+    # the old dated csv exports are superseded by the store, the newest one of each
+    # kind stays (names end in the date, so they sort by it)
+    removed = []
+    for prefix in ("accounts", "checking_transactions", "credit_transactions"):
+        for path in sorted(glob(os.path.join(DATA_DIR, f"{prefix}_*.csv")))[:-1]:
+            os.remove(path)
+            removed.append(path)
+    if removed:
+        print(f"Removed {len(removed)} old csv snapshots")
+    return removed
+
+
+if __name__ == "__main__":
+    # test usage
+    print(read_accounts())
+    print(read_transactions(start=date.today().replace(day=1)))
@@ -0,0 +1,131 @@
+import os
+import time
+import threading
+from collections import deque
+
+# lightweight timing spans around the slow stages (plaid paging, supabase requests,
+# encoding, store writes, chart rendering)
+#
+#   with tracing.span("supabase.upsert", table="transactions") as s:
+#       ...
+#       s.set(rows=len(chunk), bytes=size)
+#
+# finished spans go to an in-memory ring buffer (the performance panel reads it) and
+# refresh spans are saved to supabase next to refresh_log. tracing is off unless
+# TRACING=1, span() then hands back one shared no-op object.
+
+ENABLED = os.getenv("TRACING", "0").lower() in ("1", "true", "yes")
+MAX_SPANS = 5000
+
+_spans = deque(maxlen=MAX_SPANS)
+_local = threading.local()
+
+
+class _NoopSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **attrs):
+        pass
+
+_NOOP = _NoopSpan()
+
+
+class Span:
+    __slots__ = ("name", "attrs", "parent", "thread", "start", "wall_start", "seconds", "error")
+
+    def __init__(self, name, attrs):
+        self.name = name
+        self.attrs = attrs
+        self.seconds = None
+        self.error = None
+
+    def __enter__(self):
+        stack = _local.__dict__.setdefault("stack", [])
+        self.parent = stack[-1].name if stack else None
+        self.thread = threading.current_thread().name
+        stack.append(self)
+        self.wall_start = time.time()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.seconds = time.perf_counter() - self.start
+        if exc_type is not None:
+            self.error = exc_type.__name__
+        _local.stack.pop()
+        _spans.append(self)
+        return False
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def to_dict(self):
+        return {
+            "stage": self.name,
+            "parent": self.parent,
+            "thread": self.thread,
+            "started_at": self.wall_start,
+            "seconds": self.seconds,
+            "rows": self.attrs.get("rows"),
+            "bytes": self.attrs.get("bytes"),
+            "error": self.error,
+            "attrs": {k: v for k, v in self.attrs.items() if k not in ("rows", "bytes")},
+        }
+
+
+def span(name, **attrs):
+    if not ENABLED:
+        return _NOOP
+    return Span(name, attrs)
+
+def enable(enabled=True):
+    global ENABLED
+    ENABLED = enabled
+
+def recent(since=None, prefixes=None):
+    # finished spans as dicts, optionally only those started after `since` (epoch seconds)
+    # and whose stage starts with one of `prefixes`
+    spans = list(_spans)
+    return [
+        s.to_dict() for s in spans
+        if (since is None or s.wall_start >= since)
+        and (prefixes is None or s.name.startswith(tuple(prefixes)))
+    ]
+
+def summary(spans=None):
+    # per-stage count, total and percentiles (seconds)
+    import pandas as pd
+
+    df = pd.DataFrame(spans if spans is not None else recent())
+    if df.empty:
+        return df
+    grouped = df.groupby("stage")
+    result = grouped["seconds"].agg(
+        count="count",
+        total="sum",
+        p50=lambda s: s.quantile(0.5),
+        p90=lambda s: s.quantile(0.9),
+        p99=lambda s: s.quantile(0.99),
+        max="max",
+    )
+    result["rows"] = grouped["rows"].sum(min_count=1)
+    result["bytes"] = grouped["bytes"].sum(min_count=1)
+    return result.sort_values("total", ascending=False).reset_index()
+
+def clear():
+    _spans.clear()
+
+
+if __name__ == "__main__":
+    # test usage
+    enable()
+    for i in range(5):
+        with span("outer") as s:
+            with span("inner", rows=i):
+                time.sleep(0.01)
+            s.set(rows=i, bytes=i * 100)
+    print(summary())
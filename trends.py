@@ -0,0 +1,150 @@
+import calendar
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+# spending trends over one sorted frame, no per-merchant python loop (like recurring.py)
+#
+# unusual charges: every charge is compared with the previous WINDOW charges of the same
+# merchant (or category). one sort by (key, date) puts each group's charges next to each
+# other, a strided view over that array gives every row its previous charges, and the
+# rolling median / MAD (median absolute deviation) are row-wise medians of that view,
+# masked where the window reaches into the previous group. the EWMA runs over the same
+# sorted array in one grouped pass. a charge is unusual when its robust z-score
+# (distance above the median in scaled MADs) passes the threshold and it is at least
+# min_excess_cents above the median (a fixed price subscription has a MAD of 0).
+#
+# month-end projection: spend so far this month plus the trailing average daily spend
+# for the days that are left.
+
+WINDOW = 12            # previous charges per key the median / MAD look at
+MIN_HISTORY = 3        # charges a key needs before its next one can be unusual
+HALFLIFE = 3           # EWMA halflife, in charges
+THRESHOLD = 3.5        # robust z-score
+MIN_EXCESS_CENTS = 1_000
+MAD_SCALE = 1.4826     # MAD -> standard deviation for normally distributed amounts
+TRAILING_DAYS = 90
+CHUNK = 250_000        # rows per block of the window matrix, bounds memory on long histories
+
+
+def _row_median(a):
+    # median of each row ignoring NaN (sorting puts them last)
+    a = np.sort(a, axis=1)
+    count = (~np.isnan(a)).sum(axis=1)
+    lo = np.maximum((count - 1) // 2, 0)[:, None]
+    hi = np.maximum(count // 2, 0)[:, None]
+    median = (np.take_along_axis(a, lo, axis=1) + np.take_along_axis(a, hi, axis=1))[:, 0] / 2
+    return np.where(count > 0, median, np.nan)
+
+def rolling_stats(codes, amounts, window=WINDOW, halflife=HALFLIFE):
+    # codes / amounts sorted by (code, date). per row: charges of the same code before it
+    # (capped at window), their median, MAD and EWMA (all NaN without history)
+    n = len(codes)
+    rows = np.arange(n)
+    first = np.r_[True, codes[1:] != codes[:-1]]
+    position = rows - np.maximum.accumulate(np.where(first, rows, 0))
+    history = np.minimum(position, window)
+
+    # row i of the view holds amounts[i - window : i], lag = window - column
+    padded = np.r_[np.full(window, np.nan), amounts]
+    previous = sliding_window_view(padded, window)[:n]
+    lags = window - np.arange(window)
+
+    median = np.empty(n)
+    mad = np.empty(n)
+    for lo in range(0, n, CHUNK):
+        hi = min(lo + CHUNK, n)
+        block = np.where(lags[None, :] > position[lo:hi, None], np.nan, previous[lo:hi])
+        median[lo:hi] = _row_median(block)
+        mad[lo:hi] = _row_median(np.abs(block - median[lo:hi, None]))
+
+    # EWMA up to and including each charge, shifted one row within the group
+    ewma = pd.Series(amounts).groupby(codes, sort=True).ewm(halflife=halflife).mean().to_numpy()
+    ewma = np.where(first, np.nan, np.r_[np.nan, ewma[:-1]])
+    return history, median, mad, ewma
+
+def detect_anomalies(df, by="merchant_name", window=WINDOW, threshold=THRESHOLD, min_history=MIN_HISTORY,
+                     halflife=HALFLIFE, min_excess_cents=MIN_EXCESS_CENTS):
+    # df needs `by`, date and amount_cents; only positive charges are considered.
+    # returns the unusual charges, newest first
+    columns = ["date", by, "name", "amount_cents", "median_cents", "mad_cents", "ewma_cents", "score"]
+    df = df[df[by].notna() & (df["amount_cents"] > 0)]
+    if df.empty:
+        return pd.DataFrame(columns=columns)
+
+    codes = df[by].astype("category").cat.codes.to_numpy()
+    dates = df["date"].to_numpy().astype("datetime64[D]")
+    order = np.lexsort((dates, codes))
+    codes = codes[order]
+    amounts = df["amount_cents"].to_numpy(dtype=float)[order]
+
+    history, median, mad, ewma = rolling_stats(codes, amounts, window, halflife)
+    # 1 cent floor, a MAD of 0 still gives a finite score
+    score = (amounts - median) / np.maximum(MAD_SCALE * mad, 1.0)
+    unusual = (history >= min_history) & (score > threshold) & (amounts - median >= min_excess_cents)
+    idx = np.flatnonzero(unusual)
+
+    rows = df.iloc[order[idx]]
+    result = pd.DataFrame({
+        "date": rows["date"].to_numpy(),
+        by: rows[by].to_numpy(),
+        "name": rows["name"].to_numpy() if "name" in rows else None,
+        "amount_cents": amounts[idx].astype("int64"),
+        "median_cents": median[idx].round().astype("int64"),
+        "mad_cents": mad[idx].round().astype("int64"),
+        "ewma_cents": ewma[idx].round().astype("int64"),
+        "score": score[idx].round(1),
+    })
+    return result.sort_values(["date", "score"], ascending=False, ignore_index=True)
+
+
+def project_month_end(daily, today=None, trailing_days=TRAILING_DAYS):
+    # daily: date + spend_cents (any number of rows per date, e.g. the daily_category rollup).
+    # returns the month's cumulative actual / projected spend per day and the totals
+    today = pd.Timestamp(today or date.today()).normalize()
+    month_start = today.replace(day=1)
+    month_end = today.replace(day=calendar.monthrange(today.year, today.month)[1])
+    last_month_start = (month_start - timedelta(days=1)).replace(day=1)
+    first_day = min(last_month_start, today - timedelta(days=trailing_days))
+
+    per_day = daily.groupby("date")["spend_cents"].sum()
+    per_day = per_day.reindex(pd.date_range(first_day, today), fill_value=0)
+
+    spent = int(per_day[month_start:].sum())
+    # average over the trailing days before today (today is usually still partial)
+    rate = float(per_day[today - timedelta(days=trailing_days):today - timedelta(days=1)].mean())
+    days_left = (month_end - today).days
+    projected = spent + round(rate * days_left)
+
+    days = pd.date_range(month_start, month_end)
+    actual = per_day[month_start:].cumsum().reindex(days)
+    projection = pd.Series(np.nan, index=days)
+    projection[today:] = spent + rate * np.arange(days_left + 1)
+    curve = pd.DataFrame({"date": days, "actual_cents": actual.to_numpy(), "projected_cents": projection.to_numpy()})
+
+    return {
+        "spent_cents": spent,
+        "projected_cents": projected,
+        "daily_rate_cents": round(rate),
+        "days_left": days_left,
+        "last_month_cents": int(per_day[last_month_start:month_start - timedelta(days=1)].sum()),
+        "curve": curve,
+    }
+
+
+if __name__ == "__main__":
+    # test usage
+    rng = np.random.default_rng(0)
+    days = pd.date_range("2025-01-01", periods=120)
+    df = pd.DataFrame({
+        "date": np.tile(days, 2),
+        "merchant_name": ["Cafe"] * 120 + ["Grocer"] * 120,
+        "name": "test",
+        "amount_cents": np.r_[rng.integers(400, 600, 120), rng.integers(5_000, 7_000, 120)],
+    })
+    df.loc[100, "amount_cents"] = 4_500
+    print(detect_anomalies(df))
+    print({k: v for k, v in project_month_end(df.rename(columns={"amount_cents": "spend_cents"}),
+                                              today=date(2025, 4, 20)).items() if k != "curve"})